@@ -0,0 +1,182 @@
+# packs every texture the game uses, at every size it uses them, into one atlas
+# the atlas is stored as raw RGBA pixels next to a manifest of source hashes, so startup is a single read
+# instead of a png decode + scale per texture. it rebuilds itself when a source png's hash changes
+# run `python asset_cache.py` to force a rebuild
+
+import hashlib
+import json
+import os
+import tempfile
+from time import perf_counter
+
+import pygame
+
+CACHE_DIR = "assets/.cache"
+ATLAS_PIXELS = os.path.join(CACHE_DIR, "atlas.rgba")
+ATLAS_MANIFEST = os.path.join(CACHE_DIR, "atlas.json")
+ATLAS_VERSION = 1
+ATLAS_WIDTH = 512
+ATLAS_PADDING = 1
+
+# each size is scaled from the previous one, same as the game used to do at runtime
+FISH_SIZES = [(64, 64), (32, 32)]
+FISH_DIRS = ["assets/fish", "assets/rare_fish"]
+UNSCALED_TEXTURES = ["assets/weight.png", "assets/clock.png", "assets/cloud.png"]
+
+
+def texture_key(path: str, size: tuple[int, int] | None = None) -> str:
+    return path if size is None else f"{path}@{size[0]}x{size[1]}"
+
+
+def list_textures() -> dict[str, list[tuple[int, int] | None]]:
+    textures: dict[str, list[tuple[int, int] | None]] = {path: [None] for path in UNSCALED_TEXTURES}
+    for directory in FISH_DIRS:
+        for file in sorted(os.listdir(directory)):
+            if file == file.removesuffix(".old"):
+                textures[f"{directory}/{file}"] = list(FISH_SIZES)
+    return textures
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def describe_source(path: str, sha1: str | None = None) -> dict:
+    stat = os.stat(path)
+    return {"sha1": sha1 or hash_file(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def pack(sizes: dict[str, tuple[int, int]]) -> tuple[dict[str, tuple[int, int, int, int]], tuple[int, int]]:
+    # simple shelf packer, tallest first
+    rects = {}
+    x = y = shelf_height = 0
+    for key in sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0], k)):
+        w, h = sizes[key]
+        if x + w > ATLAS_WIDTH:
+            x = 0
+            y += shelf_height + ATLAS_PADDING
+            shelf_height = 0
+        rects[key] = (x, y, w, h)
+        x += w + ATLAS_PADDING
+        shelf_height = max(shelf_height, h)
+    return rects, (ATLAS_WIDTH, y + shelf_height)
+
+
+def build(textures: dict[str, list[tuple[int, int] | None]] | None = None) -> dict:
+    textures = textures or list_textures()
+    surfaces = {}
+    for path, sizes in textures.items():
+        texture = pygame.image.load(path)
+        for size in sizes:
+            if size is not None:
+                texture = pygame.transform.scale(texture, size)
+            surfaces[texture_key(path, size)] = texture
+
+    rects, atlas_size = pack({key: surface.get_size() for key, surface in surfaces.items()})
+    atlas = pygame.Surface(atlas_size, pygame.SRCALPHA, 32)
+    atlas.fill((0, 0, 0, 0))
+    for key, surface in surfaces.items():
+        atlas.blit(surface, rects[key][:2], special_flags=pygame.BLEND_RGBA_MAX)
+
+    manifest = {
+        "version": ATLAS_VERSION,
+        "size": list(atlas_size),
+        "textures": {key: list(rect) for key, rect in rects.items()},
+        "sources": {path: describe_source(path) for path in textures},
+        "layout": {path: [list(size) if size else None for size in sizes] for path, sizes in textures.items()},
+    }
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # pixels first, manifest last, so a half-written cache just looks stale next time
+    write_atomic(ATLAS_PIXELS, pygame.image.tobytes(atlas, "RGBA"))
+    write_atomic(ATLAS_MANIFEST, json.dumps(manifest, indent=1).encode())
+    return manifest
+
+
+def write_atomic(path: str, data: bytes):
+    # a temp file of its own, so cabinets rebuilding the cache at the same time never write into each other's
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644) # mkstemp makes it private to this user
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def check_manifest(manifest: dict, textures: dict[str, list[tuple[int, int] | None]]) -> tuple[str | None, bool]:
+    # returns (reason to rebuild, whether the manifest's mtimes need refreshing)
+    if manifest.get("version") != ATLAS_VERSION:
+        return "atlas format changed", False
+    layout = {path: [list(size) if size else None for size in sizes] for path, sizes in textures.items()}
+    if manifest.get("layout") != layout:
+        return "texture list changed", False
+    touched = False
+    for path, source in manifest["sources"].items():
+        stat = os.stat(path)
+        if stat.st_mtime_ns == source["mtime_ns"] and stat.st_size == source["size"]:
+            continue
+        sha1 = hash_file(path)
+        if sha1 != source["sha1"]:
+            return f"{path} changed", False
+        manifest["sources"][path] = describe_source(path, sha1)
+        touched = True
+    return None, touched
+
+
+class TextureAtlas:
+
+    def __init__(self, surface: pygame.Surface, rects: dict[str, tuple[int, int, int, int]]) -> None:
+        self.surface = surface
+        self.rects = rects
+        self._subsurfaces: dict[str, pygame.Surface] = {}
+
+    @classmethod
+    def load(cls, convert: bool = True) -> "TextureAtlas":
+        start = perf_counter()
+        textures = list_textures()
+        manifest = None
+        try:
+            with open(ATLAS_MANIFEST, "r") as f:
+                manifest = json.load(f)
+            reason, touched = check_manifest(manifest, textures)
+            if not reason and os.path.getsize(ATLAS_PIXELS) != manifest["size"][0] * manifest["size"][1] * 4:
+                reason = "pixel cache is truncated"
+        except (OSError, ValueError, KeyError) as e:
+            reason, touched = f"no usable cache ({e.__class__.__name__})", False
+
+        if reason:
+            manifest = build(textures)
+            print(f"[asset_cache] rebuilt texture atlas: {reason}")
+        elif touched:
+            write_atomic(ATLAS_MANIFEST, json.dumps(manifest, indent=1).encode())
+
+        with open(ATLAS_PIXELS, "rb") as f:
+            surface = pygame.image.frombytes(f.read(), tuple(manifest["size"]), "RGBA")
+        if convert and pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        print(f"[asset_cache] loaded {len(manifest['textures'])} textures in {(perf_counter()-start)*1000:.1f} ms")
+        return cls(surface, {key: tuple(rect) for key, rect in manifest["textures"].items()})
+
+    def get(self, path: str, size: tuple[int, int] | None = None) -> pygame.Surface:
+        key = texture_key(path, size)
+        texture = self._subsurfaces.get(key)
+        if texture is None:
+            texture = self.surface.subsurface(self.rects[key])
+            self._subsurfaces[key] = texture
+        return texture
+
+    def get_directory(self, directory: str, size: tuple[int, int] | None = None) -> list[pygame.Surface]:
+        suffix = "" if size is None else f"@{size[0]}x{size[1]}"
+        return [self.get(key.removesuffix(suffix), size) for key in sorted(self.rects) if key.startswith(directory + "/") and key.endswith(suffix) and (suffix or "@" not in key)]
+
+
+if __name__ == "__main__":
+    start = perf_counter()
+    manifest = build()
+    print(f"[asset_cache] built {len(manifest['textures'])} textures into a {manifest['size'][0]}x{manifest['size'][1]} atlas in {(perf_counter()-start)*1000:.1f} ms")
@@ -0,0 +1,228 @@
+# monte carlo balancing for the fishing minigames
+# scripted bots play thousands of headless minigame sessions on every core, and the catch rates,
+# catch times and weights come out per difficulty and bot
+# usage:
+#   python balance.py --sessions 20000 -o balance_output.json
+#   python balance.py --sessions 5000 --policies human --difficulties 2
+
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from controller import A_BTN, B_BTN, X_BTN, Y_BTN, BUTTON_BITS, L_X_AXIS, L_Y_AXIS, VirtualController
+from minigames import CommonMinigame, UncommonMinigame, RareMinigame
+
+DIFFICULTIES = {0: CommonMinigame, 1: UncommonMinigame, 2: RareMinigame}
+DIFFICULTY_NAMES = {0: "Common", 1: "Uncommon", 2: "Rare"}
+STEP = 1/60 # same as the game's fixed timestep
+MAX_SECONDS = 120 # sessions still running after this are counted as timeouts
+DEFAULT_SESSIONS = 10000
+CHUNK_SIZE = 250 # sessions per worker task
+DEFAULT_SEED = 1234
+
+HUMAN_REACTION_TIME = 0.25 # seconds
+HUMAN_REACTION_JITTER = 0.08
+HUMAN_AIM_ERROR = 0.15 # stick noise
+
+SEQUENCE_BUTTONS = {"A": A_BTN, "B": B_BTN, "X": X_BTN, "Y": Y_BTN}
+WEIGHT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def observe(minigame) -> dict:
+    # what a player can see on screen
+    return {
+        "fish_x": getattr(minigame, "fish_x", 0),
+        "fish_y": minigame.fish_y,
+        "bar_y": getattr(minigame, "bar_y", 0),
+        "circle_x": getattr(minigame, "circle_x", 0),
+        "circle_y": getattr(minigame, "circle_y", 0),
+        "colliding": minigame.fish_colliding,
+        "next_button": minigame.sequence[minigame.counter] if isinstance(minigame, RareMinigame) and 0 <= minigame.counter < len(minigame.sequence) else None,
+    }
+
+
+class PerfectBot:
+    # reacts to the current frame, aims straight at the fish and never misses a button
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.tapped = False
+
+    def decide(self, minigame, seen: dict) -> tuple[int, tuple[float, float]]:
+        # returns the held button mask and the left stick for this step
+        if isinstance(minigame, CommonMinigame):
+            # the bar is 80 tall and the fish 32, keep their centres together
+            return (BUTTON_BITS[A_BTN] if seen["bar_y"]+40 > seen["fish_y"]+16 else 0), (0.0, 0.0)
+        stick = self.aim(seen)
+        buttons = 0
+        if isinstance(minigame, RareMinigame) and seen["colliding"] and seen["next_button"]:
+            # buttons only count on the step they go down, so let go in between
+            if not self.tapped:
+                buttons = BUTTON_BITS[SEQUENCE_BUTTONS[seen["next_button"]]]
+            self.tapped = not self.tapped
+        return buttons, stick
+
+    def aim(self, seen: dict) -> tuple[float, float]:
+        dx = seen["fish_x"] - seen["circle_x"]
+        dy = seen["fish_y"] - seen["circle_y"]
+        # full speed until close, then ease in so the circle doesn't overshoot
+        return max(-1.0, min(1.0, dx/20)), max(-1.0, min(1.0, dy/20))
+
+
+class HumanBot(PerfectBot):
+    # the same strategy, but acting on what was on screen a reaction time ago, with a shaky thumb
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.seen: deque[dict] = deque()
+        self.delay_steps = max(1, round(rng.gauss(HUMAN_REACTION_TIME, HUMAN_REACTION_JITTER) / STEP))
+
+    def decide(self, minigame, seen: dict) -> tuple[int, tuple[float, float]]:
+        self.seen.append(seen)
+        if len(self.seen) > self.delay_steps:
+            self.seen.popleft()
+        buttons, (x, y) = super().decide(minigame, self.seen[0])
+        return buttons, (x + self.rng.gauss(0, HUMAN_AIM_ERROR), y + self.rng.gauss(0, HUMAN_AIM_ERROR))
+
+
+class RandomBot:
+    # mashes buttons and waggles the stick, the floor any payout tuning should stay above
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.buttons = 0
+        self.stick = (0.0, 0.0)
+
+    def decide(self, minigame, seen: dict) -> tuple[int, tuple[float, float]]:
+        if self.rng.random() < 0.1:
+            self.buttons = self.rng.choice([0, 0, BUTTON_BITS[A_BTN], BUTTON_BITS[B_BTN], BUTTON_BITS[X_BTN], BUTTON_BITS[Y_BTN]])
+            self.stick = (self.rng.uniform(-1, 1), self.rng.uniform(-1, 1))
+        return self.buttons, self.stick
+
+
+POLICIES = {
+    "perfect": PerfectBot,
+    "human": HumanBot,
+    "random": RandomBot,
+}
+
+
+def play_session(difficulty: int, policy: str, rng: random.Random, max_steps: int) -> tuple[float, int]:
+    # returns the payout (nan on timeout) and how many steps it took
+    controller = VirtualController()
+    minigame = DIFFICULTIES[difficulty](None, None, None)
+    bot = POLICIES[policy](rng)
+    keys = [False] * 512
+    for step in range(1, max_steps+1):
+        buttons, (x, y) = bot.decide(minigame, observe(minigame))
+        axes = controller.axes
+        axes[L_X_AXIS] = max(-1.0, min(1.0, x))
+        axes[L_Y_AXIS] = max(-1.0, min(1.0, y))
+        controller.set_state(buttons)
+        controller.update()
+        result = minigame.update(controller, keys, STEP)
+        if result is not None:
+            return result, step
+    return float("nan"), max_steps
+
+
+def run_chunk(difficulty: int, policy: str, sessions: int, seed: int, max_seconds: float) -> tuple[list[float], list[int]]:
+    # minigames roll their dice on the global random module, so each chunk seeds it
+    random.seed(seed)
+    rng = random.Random(seed ^ 0x5EED)
+    max_steps = round(max_seconds / STEP)
+    weights, steps = [], []
+    for _ in range(sessions):
+        weight, taken = play_session(difficulty, policy, rng, max_steps)
+        weights.append(weight)
+        steps.append(taken)
+    return weights, steps
+
+
+def summarize(weights: np.ndarray, steps: np.ndarray) -> dict:
+    finished = ~np.isnan(weights)
+    caught = finished & (weights > 0)
+    seconds = steps * STEP
+    out = {
+        "sessions": len(weights),
+        "catch_rate": round(float(caught.mean()), 4),
+        "timeout_rate": round(float((~finished).mean()), 4),
+        "mean_payout": round(float(np.nanmean(np.where(finished, weights, 0.0))), 3),
+    }
+    if caught.any():
+        out["time_to_catch_s"] = {f"p{pct}": round(float(np.percentile(seconds[caught], pct)), 3) for pct in (50, 95)}
+        out["time_to_catch_s"]["mean"] = round(float(seconds[caught].mean()), 3)
+        out["weight"] = {f"p{pct}": round(float(np.percentile(weights[caught], pct)), 2) for pct in WEIGHT_PERCENTILES}
+        out["weight"]["mean"] = round(float(weights[caught].mean()), 2)
+    lost = finished & (weights < 0)
+    if lost.any():
+        out["penalty_rate"] = round(float(lost.mean()), 4)
+        out["mean_penalty"] = round(float(weights[lost].mean()), 2)
+    return out
+
+
+def run(sessions: int, policies: list[str], difficulties: list[int], seed: int, max_seconds: float, workers: int | None) -> dict:
+    jobs = {}
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for difficulty in difficulties:
+            for policy in policies:
+                futures = []
+                for chunk, first in enumerate(range(0, sessions, CHUNK_SIZE)):
+                    # string seeding is stable across processes, unlike hash()
+                    chunk_seed = random.Random(f"{seed}/{difficulty}/{policy}/{chunk}").getrandbits(32)
+                    futures.append(pool.submit(run_chunk, difficulty, policy, min(CHUNK_SIZE, sessions-first), chunk_seed, max_seconds))
+                jobs[(difficulty, policy)] = futures
+
+        results = {}
+        for (difficulty, policy), futures in jobs.items():
+            weights, steps = [], []
+            for future in futures:
+                chunk_weights, chunk_steps = future.result()
+                weights.extend(chunk_weights)
+                steps.extend(chunk_steps)
+            stats = summarize(np.array(weights), np.array(steps))
+            results.setdefault(DIFFICULTY_NAMES[difficulty], {})[policy] = stats
+            catch_time = stats.get("time_to_catch_s", {}).get("p50", float("nan"))
+            mean_weight = stats.get("weight", {}).get("mean", float("nan"))
+            print(f"[balance] {DIFFICULTY_NAMES[difficulty]:9} {policy:8} catch {stats['catch_rate']:6.1%}  timeout {stats['timeout_rate']:6.1%}  p50 catch {catch_time:6.2f}s  mean weight {mean_weight:6.1f} lbs", file=sys.stderr)
+
+    return {
+        "version": 1,
+        "sessions": sessions,
+        "seed": seed,
+        "max_seconds": max_seconds,
+        "wall_seconds": round(perf_counter()-start, 2),
+        "difficulties": results,
+    }
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Monte carlo minigame balancing with scripted bots")
+    parser.add_argument("-o", "--output", default="balance_output.json")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="sessions per difficulty and policy")
+    parser.add_argument("--policies", nargs="*", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--difficulties", type=int, nargs="*", default=list(DIFFICULTIES), choices=list(DIFFICULTIES))
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    results = run(args.sessions, args.policies, args.difficulties, args.seed, args.max_seconds, args.workers)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[balance] {args.sessions*len(args.policies)*len(args.difficulties)} sessions in {results['wall_seconds']}s, wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
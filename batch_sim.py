@@ -0,0 +1,304 @@
+# vectorized minigame simulator: thousands of independent sessions advance together as numpy arrays
+# it follows the same rules and tunables as the minigame classes and the balance.py bots, so the
+# numbers match balance.py statistically (not bit for bit, the dice are rolled in a different order)
+# usage:
+#   python batch_sim.py run --difficulty 1 --policy perfect --sessions 100000
+#   python batch_sim.py compare --sessions 5000
+#   python batch_sim.py grid --difficulty 0 --param FISH_SPEED 100 125 150 --param CATCH_AT 8 10 12
+
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import itertools
+import json
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import balance
+from minigames import FRAME_SIZE, CommonMinigame, UncommonMinigame, RareMinigame
+
+POLICIES = ("perfect", "random") # the reaction delay of balance.py's human bot isn't vectorized
+DEFAULT_SESSIONS = 20000
+DEFAULT_SEED = 1234
+STEP = balance.STEP
+COMPARE_Z_LIMIT = 4.0 # how many standard errors apart the two simulators may be before compare fails
+
+# balance.py's random bot: 1 in 10 steps it picks again from these, A/B/X/Y as button bits 0-3
+RANDOM_REPICK_ODDS = 0.1
+RANDOM_BUTTON_CHOICES = np.array([0, 0, 1, 2, 4, 8])
+
+# the fish-follows-the-bar check in CommonMinigame.update
+BAR_HEIGHT = 80
+FISH_HEIGHT = 32
+
+
+def tunables(minigame: type, overrides: dict | None = None) -> dict:
+    params = {name: getattr(minigame, name) for name in dir(minigame) if name.isupper()}
+    params.update(overrides or {})
+    return params
+
+
+def move_odds(params: dict, direction: np.ndarray) -> np.ndarray:
+    odds = params["FISH_MOVE_ODDS"]
+    return np.select([direction == 1, direction == -1], [odds.get(1, 50), odds.get(-1, 50)], odds.get(0, 50))
+
+
+def circle_bounds(x: np.ndarray, y: np.ndarray, radius: int) -> tuple[np.ndarray, ...]:
+    # minigames.circle_bounds: a rect centred on the truncated position, clipped to the frame
+    left = np.trunc(x) - radius
+    top = np.trunc(y) - radius
+    right = np.minimum(left + radius*2, FRAME_SIZE[0])
+    bottom = np.minimum(top + radius*2, FRAME_SIZE[1])
+    left = np.maximum(left, 0)
+    top = np.maximum(top, 0)
+    return left, top, right, bottom
+
+
+def colliding(state: dict, params: dict) -> np.ndarray:
+    cl, ct, cr, cb = circle_bounds(state["circle_x"], state["circle_y"], params["CIRCLE_RADIUS"])
+    fl, ft, fr, fb = circle_bounds(state["fish_x"], state["fish_y"], params["FISH_RADIUS"])
+    # pygame never reports a collision with an empty rect
+    return (cr > cl) & (cb > ct) & (fr > fl) & (fb > ft) & (cl < fr) & (fl < cr) & (ct < fb) & (ft < cb)
+
+
+def random_policy(state: dict, rng: np.random.Generator):
+    n = len(state["buttons"])
+    repick = rng.random(n) < RANDOM_REPICK_ODDS
+    count = int(repick.sum())
+    state["buttons"][repick] = rng.choice(RANDOM_BUTTON_CHOICES, count)
+    state["stick_x"][repick] = rng.uniform(-1, 1, count)
+    state["stick_y"][repick] = rng.uniform(-1, 1, count)
+
+
+def new_state(difficulty: int, n: int, params: dict, rng: np.random.Generator) -> dict:
+    state = {
+        "lane": np.arange(n),
+        "buttons": np.zeros(n, np.int64),
+        "previous_buttons": np.zeros(n, np.int64),
+        "stick_x": np.zeros(n),
+        "stick_y": np.zeros(n),
+        "fish_y": np.zeros(n),
+        "direction_y": np.zeros(n, np.int64),
+    }
+    if difficulty == 0:
+        state["bar_y"] = np.zeros(n)
+        state["counter"] = np.full(n, float(params["COUNTER_START"]))
+        return state
+    state |= {
+        "fish_x": np.full(n, 250.0),
+        "direction_x": np.zeros(n, np.int64),
+        "circle_x": np.full(n, 250.0),
+        "circle_y": np.full(n, 120.0),
+        "colliding": np.zeros(n, bool),
+    }
+    state["fish_y"][:] = 120.0
+    if difficulty == 1:
+        state["counter"] = np.full(n, float(params["COUNTER_START"]))
+    else:
+        state["counter"] = np.zeros(n, np.int64)
+        state["time_clock"] = np.zeros(n)
+        state["sequence"] = rng.integers(0, 4, (n, params["SEQUENCE_LENGTH"]))
+        state["tapped"] = np.zeros(n, bool)
+    return state
+
+
+def step_common(state: dict, params: dict, policy: str, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    n = len(state["lane"])
+    if policy == "perfect":
+        held = state["bar_y"] + BAR_HEIGHT/2 > state["fish_y"] + FISH_HEIGHT/2
+    else:
+        random_policy(state, rng)
+        held = (state["buttons"] & 1).astype(bool)
+
+    bar_y = np.where(held, state["bar_y"] - params["BAR_RISE_SPEED"]*STEP, state["bar_y"] + params["BAR_FALL_SPEED"]*STEP)
+    state["bar_y"] = np.clip(bar_y, *params["BAR_RANGE"])
+
+    up = rng.integers(0, 101, n) > move_odds(params, state["direction_y"])
+    fish_y = state["fish_y"] + np.where(up, -params["FISH_SPEED"]*STEP, params["FISH_SPEED"]*STEP)
+    direction = np.where(up, 1, -1)
+    clamped = np.clip(fish_y, *params["FISH_RANGE"])
+    direction[clamped != fish_y] = 0
+    state["fish_y"], state["direction_y"] = clamped, direction
+
+    on_fish = (state["fish_y"] + FISH_HEIGHT > state["bar_y"]) & (state["fish_y"] < state["bar_y"] + BAR_HEIGHT)
+    state["counter"] += np.where(on_fish, params["COUNTER_GAIN"]*STEP, -params["COUNTER_LOSS"]*STEP)
+    return state["counter"] > params["CATCH_AT"], state["counter"] < 0
+
+
+def step_circle(state: dict, params: dict, policy: str, rng: np.random.Generator, rare: bool) -> tuple[np.ndarray, np.ndarray]:
+    n = len(state["lane"])
+    if policy == "perfect":
+        # balance.PerfectBot.aim, then the controller's rounding to a tenth
+        stick_x = np.round(np.clip((state["fish_x"] - state["circle_x"]) / 20, -1, 1), 1)
+        stick_y = np.round(np.clip((state["fish_y"] - state["circle_y"]) / 20, -1, 1), 1)
+        if rare:
+            # tap the next button on every other step while on the fish
+            act = state["colliding"]
+            next_button = np.take_along_axis(state["sequence"], (state["counter"] % params["SEQUENCE_LENGTH"])[:, None], 1)[:, 0]
+            state["buttons"] = np.where(act & ~state["tapped"], 1 << next_button, 0)
+            state["tapped"] = np.where(act, ~state["tapped"], state["tapped"])
+    else:
+        random_policy(state, rng)
+        stick_x = np.round(state["stick_x"], 1)
+        stick_y = np.round(state["stick_y"], 1)
+
+    circle_x = state["circle_x"] + stick_x * params["CIRCLE_SPEED"] * STEP
+    circle_y = state["circle_y"] + stick_y * params["CIRCLE_SPEED"] * STEP
+
+    speed = params["FISH_SPEED"] * STEP
+    right = rng.integers(0, 101, n) > move_odds(params, state["direction_x"])
+    state["fish_x"] = state["fish_x"] + np.where(right, speed, -speed)
+    state["direction_x"] = np.where(right, 1, -1)
+    up = rng.integers(0, 101, n) > move_odds(params, state["direction_y"])
+    state["fish_y"] = state["fish_y"] + np.where(up, -speed, speed)
+    state["direction_y"] = np.where(up, 1, -1)
+
+    # the minigames reset the fish's direction when the *circle* hits a wall, kept as is
+    state["circle_x"] = np.clip(circle_x, 16, 510)
+    state["circle_y"] = np.clip(circle_y, 0, 230)
+    state["direction_x"][state["circle_x"] != circle_x] = 0
+    state["direction_y"][state["circle_y"] != circle_y] = 0
+    state["fish_x"] = np.clip(state["fish_x"], 16, 510)
+    state["fish_y"] = np.clip(state["fish_y"], 0, 230)
+
+    state["colliding"] = colliding(state, params)
+    if not rare:
+        state["counter"] += np.where(state["colliding"], params["COUNTER_GAIN"]*STEP, -params["COUNTER_LOSS"]*STEP)
+        return state["counter"] > params["CATCH_AT"], state["counter"] < 0
+
+    state["time_clock"] += np.where(state["colliding"], 0.0, STEP)
+    slipped = state["time_clock"] > params["ESCAPE_TIME"]
+    state["counter"] -= slipped
+    state["time_clock"][slipped] = 0.0
+
+    pressed = state["buttons"] & ~state["previous_buttons"] & 0xF
+    state["previous_buttons"] = state["buttons"].copy()
+    if not state.get("first_frame_done"):
+        pressed[:] = 0
+    # python indexes a slipped-to -1 counter from the end of the sequence, so wrap the same way
+    next_bit = 1 << np.take_along_axis(state["sequence"], (state["counter"] % params["SEQUENCE_LENGTH"])[:, None], 1)[:, 0]
+    hit = (pressed & next_bit) != 0
+    state["counter"] += np.where(hit, np.where(state["colliding"], 1, -1), 0)
+    wrong = pressed & ~next_bit
+    state["counter"] -= (wrong & 1) + (wrong >> 1 & 1) + (wrong >> 2 & 1) + (wrong >> 3 & 1)
+    return state["counter"] >= params["SEQUENCE_LENGTH"], state["counter"] < 0
+
+
+def simulate(difficulty: int, policy: str, sessions: int, seed: int, overrides: dict | None = None, max_seconds: float = balance.MAX_SECONDS) -> tuple[np.ndarray, np.ndarray]:
+    # returns every session's payout (nan on timeout) and step count, like balance.run_chunk
+    minigame = balance.DIFFICULTIES[difficulty]
+    params = tunables(minigame, overrides)
+    rng = np.random.default_rng(seed)
+    weights = np.full(sessions, np.nan)
+    steps = np.full(sessions, round(max_seconds / STEP), np.int64)
+
+    state = new_state(difficulty, sessions, params, rng)
+    for step in range(1, round(max_seconds / STEP) + 1):
+        if difficulty == 0:
+            caught, failed = step_common(state, params, policy, rng)
+        else:
+            caught, failed = step_circle(state, params, policy, rng, difficulty == 2)
+            state["first_frame_done"] = True
+
+        lanes = state["lane"]
+        if caught.any():
+            weights[lanes[caught]] = rng.integers(params["WEIGHT_RANGE"][0], params["WEIGHT_RANGE"][1]+1, int(caught.sum())) / 10
+        if failed.any():
+            if difficulty == 2:
+                weights[lanes[failed]] = rng.integers(params["PENALTY_RANGE"][0], params["PENALTY_RANGE"][1]+1, int(failed.sum())) / 15
+            else:
+                weights[lanes[failed]] = 0.0
+        finished = caught | failed
+        if finished.any():
+            steps[lanes[finished]] = step
+            keep = ~finished
+            state = {key: value[keep] if isinstance(value, np.ndarray) else value for key, value in state.items()}
+            if not len(state["lane"]):
+                break
+    return weights, steps
+
+
+def parse_value(text: str) -> int | float:
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Vectorized minigame simulator")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="simulate one difficulty and policy")
+    run_parser.add_argument("--difficulty", type=int, default=0, choices=list(balance.DIFFICULTIES))
+    run_parser.add_argument("--policy", default="perfect", choices=POLICIES)
+    run_parser.add_argument("--set", nargs=2, action="append", default=[], metavar=("NAME", "VALUE"), help="override a minigame tunable")
+
+    compare_parser = sub.add_parser("compare", help="check the batch simulator against the scalar minigames, exits 1 on a mismatch")
+    compare_parser.add_argument("--policies", nargs="*", default=list(POLICIES), choices=POLICIES)
+    compare_parser.add_argument("--difficulties", type=int, nargs="*", default=list(balance.DIFFICULTIES), choices=list(balance.DIFFICULTIES))
+
+    grid_parser = sub.add_parser("grid", help="sweep every combination of the given tunables")
+    grid_parser.add_argument("--difficulty", type=int, default=0, choices=list(balance.DIFFICULTIES))
+    grid_parser.add_argument("--policy", default="perfect", choices=POLICIES)
+    grid_parser.add_argument("--param", nargs="+", action="append", default=[], metavar="NAME VALUE", help="a tunable and the values to try")
+
+    for sub_parser in (run_parser, compare_parser, grid_parser):
+        sub_parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+        sub_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+        sub_parser.add_argument("-o", "--output", help="write the results as json")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    if args.command == "run":
+        overrides = {name: parse_value(value) for name, value in args.set}
+        stats = balance.summarize(*simulate(args.difficulty, args.policy, args.sessions, args.seed, overrides))
+        results = {"difficulty": args.difficulty, "policy": args.policy, "overrides": overrides, **stats}
+        print(f"[batch_sim] {balance.DIFFICULTY_NAMES[args.difficulty]} {args.policy}: catch {stats['catch_rate']:.1%}, mean payout {stats['mean_payout']:.2f} lbs", file=sys.stderr)
+        failed = False
+
+    elif args.command == "compare":
+        results = {}
+        failed = False
+        for difficulty in args.difficulties:
+            for policy in args.policies:
+                scalar = balance.run_chunk(difficulty, policy, args.sessions, args.seed, balance.MAX_SECONDS)
+                batch = simulate(difficulty, policy, args.sessions, args.seed)
+                row = {}
+                for name, (scalar_values, batch_values) in {
+                    "catch_rate": ((np.array(scalar[0]) > 0).astype(float), (batch[0] > 0).astype(float)),
+                    "steps": (np.array(scalar[1], float), batch[1].astype(float)),
+                    "payout": (np.nan_to_num(np.array(scalar[0])), np.nan_to_num(batch[0])),
+                }.items():
+                    error = np.sqrt(scalar_values.var()/len(scalar_values) + batch_values.var()/len(batch_values))
+                    z = (batch_values.mean() - scalar_values.mean()) / error if error else 0.0
+                    row[name] = {"scalar": round(float(scalar_values.mean()), 4), "batch": round(float(batch_values.mean()), 4), "z": round(float(z), 2)}
+                    flag = ""
+                    if abs(z) > COMPARE_Z_LIMIT:
+                        flag = "  MISMATCH"
+                        failed = True
+                    print(f"{balance.DIFFICULTY_NAMES[difficulty]:9} {policy:8} {name:10} scalar {scalar_values.mean():9.3f}  batch {batch_values.mean():9.3f}  z {z:+6.2f}{flag}")
+                results.setdefault(balance.DIFFICULTY_NAMES[difficulty], {})[policy] = row
+
+    else:
+        names = [values[0] for values in args.param]
+        grids = [[parse_value(value) for value in values[1:]] for values in args.param]
+        results = {"difficulty": args.difficulty, "policy": args.policy, "cells": []}
+        for combination in itertools.product(*grids):
+            overrides = dict(zip(names, combination))
+            stats = balance.summarize(*simulate(args.difficulty, args.policy, args.sessions, args.seed, overrides))
+            results["cells"].append({"overrides": overrides, **stats})
+            catch_time = stats.get("time_to_catch_s", {}).get("p50", float("nan"))
+            print(f"{' '.join(f'{name}={value}' for name, value in overrides.items()):40} catch {stats['catch_rate']:6.1%}  p50 catch {catch_time:6.2f}s  mean payout {stats['mean_payout']:7.2f} lbs")
+        failed = False
+
+    print(f"[batch_sim] done in {perf_counter()-start:.2f}s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,222 @@
+# headless frame time benchmark
+# runs every scene and minigame for a fixed number of frames under SDL's dummy drivers
+# usage:
+#   python benchmark.py run -o bench_output.json
+#   python benchmark.py compare baseline.json bench_output.json --threshold 0.1
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import pygame
+import main
+import minigames
+
+DEFAULT_FRAMES = 600
+WARMUP_FRAMES = 30
+DEFAULT_SEED = 1234
+DEFAULT_THRESHOLD = 0.10 # relative slowdown that counts as a regression
+NOISE_FLOOR_MS = 0.05 # ignore regressions smaller than this, they're just timer noise
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+# tracemalloc's own bookkeeping isn't the game's
+TRACEMALLOC_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+# name, scene, difficulty, minigame class
+SCENARIOS = [
+    ("main_menu", 2, 0, None),
+    ("tutorial", 3, 0, None),
+    ("difficulty_selector", 4, 0, None),
+    ("minigame_tutorial", 5, 2, None),
+    ("name_selector", 6, 0, None),
+    ("game", 0, 0, None),
+    ("end_menu", 1, 0, None),
+    ("minigame_demo", 0, -1, minigames.DemoMinigame),
+    ("minigame_common", 0, 0, minigames.CommonMinigame),
+    ("minigame_uncommon", 0, 1, minigames.UncommonMinigame),
+    ("minigame_rare", 0, 2, minigames.RareMinigame),
+]
+
+SAMPLE_NAMES = ["Alice", "Bob", "Charlie", "Dana", "Eli", "Frankie", "Gus", "Harper", "Ivy", "Jules", "Kai", "Lou"]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values)-1, max(0, round(pct/100 * (len(sorted_values)-1))))
+    return sorted_values[idx]
+
+
+def make_game(workdir: str, dirty_rects: bool) -> main.Game:
+    names_file = os.path.join(workdir, "names.txt")
+    high_scores_file = os.path.join(workdir, "high_scores.txt")
+    with open(names_file, "w") as f:
+        f.write("\n".join(SAMPLE_NAMES))
+    with open(high_scores_file, "w") as f:
+        f.write("\n".join(f"{name} | {100-i*7.5} | Common" for i, name in enumerate(SAMPLE_NAMES)))
+    game = main.Game(hardware=False, names_file=names_file, high_scores_file=high_scores_file)
+    game.rendering_engine.dirty_rects = dirty_rects
+    return game
+
+
+def enter_scenario(game: main.Game, scene: int, difficulty: int):
+    game.scene = scene
+    game.difficulty = difficulty
+    game.score = 0
+    game.fish_clock = main.FISH_CLOCK_FULL
+    game.game_clock = 180
+    game.game_end_reason = "Benchmark"
+    game.current_frame = None
+    engine = game.rendering_engine
+    engine.scene_transfer_stage = 0
+    engine.black_screen_alpha = 0
+    engine.black_screen.set_alpha(0)
+    engine.prepare_scene(scene, difficulty, game.controller.nintendo_mode, game.roster)
+
+
+def keep_in_scenario(game: main.Game, scene: int, difficulty: int, minigame: type | None):
+    # nobody is pressing anything, so keep the clocks topped up and restart finished minigames
+    # instead of letting the game wander off to another scene
+    if game.scene != scene or game.rendering_engine.scene_transfer_stage != 0:
+        enter_scenario(game, scene, difficulty)
+    game.fish_clock = main.FISH_CLOCK_FULL
+    game.game_clock = 180
+    if minigame and not game.current_frame:
+        game.current_frame = minigame(game, game.rendering_engine, game.lighting)
+
+
+def run_scenario(game: main.Game, scene: int, difficulty: int, minigame: type | None, frames: int, seed: int) -> dict[str, float]:
+    random.seed(seed)
+    game.rendering_engine.rng.seed(seed)
+    enter_scenario(game, scene, difficulty)
+    for _ in range(WARMUP_FRAMES):
+        keep_in_scenario(game, scene, difficulty, minigame)
+        game.run_frame(1/60)
+
+    times = []
+    for _ in range(frames):
+        keep_in_scenario(game, scene, difficulty, minigame)
+        start = perf_counter()
+        game.run_frame(1/60)
+        times.append((perf_counter()-start) * 1000)
+
+    # allocations get their own pass since tracemalloc slows everything down
+    random.seed(seed)
+    game.rendering_engine.rng.seed(seed)
+    enter_scenario(game, scene, difficulty)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+    for _ in range(frames):
+        keep_in_scenario(game, scene, difficulty, minigame)
+        game.run_frame(1/60)
+    after = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+    tracemalloc.stop()
+    # everything the frames allocated that's still around, per line, so a scene that starts
+    # keeping a surface or a list alive each frame shows up here
+    diffs = after.compare_to(before, "lineno")
+    allocated = sum(diff.size_diff for diff in diffs if diff.size_diff > 0)
+    allocations = sum(diff.count_diff for diff in diffs if diff.count_diff > 0)
+
+    times.sort()
+    return {
+        "p50_ms": round(percentile(times, 50), 4),
+        "p95_ms": round(percentile(times, 95), 4),
+        "p99_ms": round(percentile(times, 99), 4),
+        "mean_ms": round(sum(times)/len(times), 4),
+        "max_ms": round(times[-1], 4),
+        "alloc_kib_per_frame": round(allocated/frames/1024, 3),
+        "allocs_per_frame": round(allocations/frames, 2),
+    }
+
+
+def run(frames: int, seed: int, dirty_rects: bool, only: list[str] | None = None) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        game = make_game(workdir, dirty_rects)
+        for name, scene, difficulty, minigame in SCENARIOS:
+            if only and name not in only:
+                continue
+            results[name] = run_scenario(game, scene, difficulty, minigame, frames, seed)
+            print(f"[benchmark] {name:20} p50 {results[name]['p50_ms']:7.3f} ms  p95 {results[name]['p95_ms']:7.3f} ms  p99 {results[name]['p99_ms']:7.3f} ms  {results[name]['alloc_kib_per_frame']:8.2f} KiB/frame  {results[name]['allocs_per_frame']:8.2f} allocs/frame", file=sys.stderr)
+    return {
+        "version": 1,
+        "frames": frames,
+        "seed": seed,
+        "dirty_rects": dirty_rects,
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "scenes": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, base_stats in baseline["scenes"].items():
+        if name not in current["scenes"]:
+            continue
+        for metric in COMPARED_METRICS:
+            old = base_stats[metric]
+            new = current["scenes"][name][metric]
+            change = (new-old)/old if old else 0.0
+            flag = ""
+            if new-old > NOISE_FLOOR_MS and change > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}")
+            print(f"{name:20} {metric:7} {old:8.3f} -> {new:8.3f} ms ({change:+.1%}){flag}")
+    return regressions
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Headless per-scene frame time benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run the benchmark and write the results as json")
+    run_parser.add_argument("-o", "--output", default="bench_output.json")
+    run_parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run_parser.add_argument("--dirty-rects", action="store_true")
+    run_parser.add_argument("--only", nargs="*", help="only run these scenes")
+    run_parser.add_argument("--baseline", help="compare against this baseline after running")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = sub.add_parser("compare", help="diff two result files, exits 1 on regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.frames, args.seed, args.dirty_rects, args.only)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[benchmark] wrote {args.output}", file=sys.stderr)
+        if not args.baseline:
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            results = json.load(f)
+
+    regressions = compare(baseline, results, args.threshold)
+    if regressions:
+        print(f"[benchmark] {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
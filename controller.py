@@ -1,5 +1,5 @@
-
 import pygame
+from dataclasses import dataclass
 
 L_X_AXIS = 0
 L_Y_AXIS = 1
@@ -7,6 +7,7 @@ L_TRIGGER_AXIS = 2
 R_X_AXIS = 3
 R_Y_AXIS = 4
 R_TRIGGER_AXIS = 5
+AXIS_COUNT = 6
 
 A_BTN = 0
 B_BTN = 1
@@ -22,20 +23,61 @@ R_STICK_BTN = 10
 
 DPAD_HAT = 0
 
-class Controller:
+# bit positions in a snapshot's button mask. the face and shoulder buttons come first in the same order
+# as the public button ids below (controller.a, controller.lb, ...), so button id n is bit n
+BUTTON_BITS = {
+    A_BTN: 1 << 0,
+    B_BTN: 1 << 1,
+    X_BTN: 1 << 2,
+    Y_BTN: 1 << 3,
+    L_BTN: 1 << 4,
+    R_BTN: 1 << 5,
+    L_STICK_BTN: 1 << 6,
+    R_STICK_BTN: 1 << 7,
+    SELECT_BTN: 1 << 8,
+    START_BTN: 1 << 9,
+    HOME_BTN: 1 << 10,
+}
+DPAD_UP = 1 << 11
+DPAD_DOWN = 1 << 12
+DPAD_LEFT = 1 << 13
+DPAD_RIGHT = 1 << 14
+DPAD_BITS = (DPAD_UP, DPAD_DOWN, DPAD_LEFT, DPAD_RIGHT)
+TRIGGER_BITS = (1 << 15, 1 << 16) # lt, rt held past halfway
+
+TRIGGER_THRESHOLD = 0.5
+
+# button id -> mask, with a/b and x/y swapped for nintendo layouts
+STANDARD_BUTTON_MASKS = tuple(1 << button for button in range(len(BUTTON_BITS)))
+NINTENDO_BUTTON_MASKS = tuple(1 << (button ^ 1 if button < 4 else button) for button in range(len(BUTTON_BITS)))
+
+@dataclass(frozen=True, slots=True)
+class InputSnapshot:
+    # everything the game reads from the controller during one simulation step
+    buttons: int = 0 # buttons, dpad directions and triggers, see the *_BITS constants
+    pressed: int = 0 # went down since the last snapshot
+    released: int = 0 # went up since the last snapshot
+    axes: tuple[float, ...] = (0.0,) * AXIS_COUNT # sticks rounded to 0.1, raw triggers
+    dpad: tuple[int, int] = (0, 0)
+    triggers: tuple[float, float] = (0.0, 0.0) # 0 to 1
+
+EMPTY_SNAPSHOT = InputSnapshot()
 
-    def __init__(self, controller_id: int) -> None:
-        pygame.joystick.init()
+class Controller:
 
-        try:
-            self.controller = pygame.joystick.Joystick(controller_id)
-            self.loaded = True
-        except pygame.error:
-            self.loaded = False
+    def __init__(self, controller_id: int | None) -> None:
+        self.loaded = False
+        if controller_id is not None:
+            pygame.joystick.init()
+            try:
+                self.controller = pygame.joystick.Joystick(controller_id)
+                self.loaded = True
+            except pygame.error:
+                pass
 
         self.left_stick = L_X_AXIS
         self.right_stick = R_X_AXIS
-        
+
         self.a = 0
         self.b = 1
         self.x = 2
@@ -47,129 +89,139 @@ class Controller:
         self.select = 8
         self.start = 9
         self.home = 10
-        
+
         self.lt = 0
         self.rt = 1
-        
-        self.current_buttons = [False, False, False, False, False, False, False, False, False, False, False]
-        self.current_dpad = [0.0, 0.0]
-        self.current_triggers = [0.0, 0.0]
-        self.previous_buttons = self.current_buttons.copy()
-        self.previous_dpad = self.current_dpad.copy()
-        self.previous_triggers = self.current_triggers.copy()
 
-        self.nintendo_mode = False
+        # live state, kept up to date by handle_event() and turned into a snapshot by update()
+        self.held_buttons = 0
+        self.tapped_buttons = 0 # went down since the last snapshot, so a press and release between two steps still counts
+        self.hat = (0, 0)
+        self.axes = [0.0] * AXIS_COUNT
+        self.axes[L_TRIGGER_AXIS] = self.axes[R_TRIGGER_AXIS] = -1.0
+
+        self.snapshot = EMPTY_SNAPSHOT
+
+        self.button_masks = STANDARD_BUTTON_MASKS
+        self._nintendo_mode = False
 
         self.a_proceeds = True
         self.b_proceeds = False
 
         if self.loaded:
+            self.instance_id = self.controller.get_instance_id()
+            self.poll()
             print(f"[controller] located controller "+self.controller.get_name())
-    
+
+    @property
+    def nintendo_mode(self) -> bool:
+        return self._nintendo_mode
+
+    @nintendo_mode.setter
+    def nintendo_mode(self, enabled: bool):
+        self._nintendo_mode = enabled
+        self.button_masks = NINTENDO_BUTTON_MASKS if enabled else STANDARD_BUTTON_MASKS
+
+    def poll(self) -> None:
+        # reads the whole device once, for the state before the first events arrive
+        self.held_buttons = 0
+        for button, bit in BUTTON_BITS.items():
+            if self.controller.get_button(button):
+                self.held_buttons |= bit
+        self.hat = self.controller.get_hat(DPAD_HAT)
+        for axis in range(min(AXIS_COUNT, self.controller.get_numaxes())):
+            self.axes[axis] = self.controller.get_axis(axis)
+
+    def handle_event(self, event: pygame.Event) -> None:
+        if not self.loaded or getattr(event, "instance_id", None) != self.instance_id:
+            return
+        match event.type:
+            case pygame.JOYBUTTONDOWN:
+                bit = BUTTON_BITS.get(event.button, 0)
+                self.held_buttons |= bit
+                self.tapped_buttons |= bit
+            case pygame.JOYBUTTONUP:
+                self.held_buttons &= ~BUTTON_BITS.get(event.button, 0)
+            case pygame.JOYHATMOTION if event.hat == DPAD_HAT:
+                self.hat = event.value
+            case pygame.JOYAXISMOTION if event.axis < AXIS_COUNT:
+                self.axes[event.axis] = event.value
+
     def update(self) -> None:
-        if self.loaded:
-            self.previous_buttons = self.current_buttons.copy()
-            self.previous_dpad = self.current_dpad.copy()
-            self.previous_triggers = self.current_triggers.copy()
-            self.current_buttons = [
-                bool(self.controller.get_button(A_BTN)),
-                bool(self.controller.get_button(B_BTN)),
-                bool(self.controller.get_button(X_BTN)),
-                bool(self.controller.get_button(Y_BTN)),
-                bool(self.controller.get_button(L_BTN)),
-                bool(self.controller.get_button(R_BTN)),
-                bool(self.controller.get_button(L_STICK_BTN)),
-                bool(self.controller.get_button(R_STICK_BTN)),
-                bool(self.controller.get_button(SELECT_BTN)),
-                bool(self.controller.get_button(START_BTN)),
-                bool(self.controller.get_button(HOME_BTN)),
-            ]
-            self.current_dpad = list(self.controller.get_hat(DPAD_HAT))
-            self.current_triggers = [(self.controller.get_axis(L_TRIGGER_AXIS)+1)/2, (self.controller.get_axis(R_TRIGGER_AXIS)+1)/2]
+        if not self.loaded:
+            return
+        hat_x, hat_y = self.hat
+        left_trigger = (self.axes[L_TRIGGER_AXIS]+1)/2
+        right_trigger = (self.axes[R_TRIGGER_AXIS]+1)/2
+        buttons = (
+            self.held_buttons | self.tapped_buttons
+            | (DPAD_UP if hat_y > 0 else 0) | (DPAD_DOWN if hat_y < 0 else 0)
+            | (DPAD_LEFT if hat_x < 0 else 0) | (DPAD_RIGHT if hat_x > 0 else 0)
+            | (TRIGGER_BITS[0] if left_trigger > TRIGGER_THRESHOLD else 0)
+            | (TRIGGER_BITS[1] if right_trigger > TRIGGER_THRESHOLD else 0)
+        )
+        previous = self.snapshot.buttons
+        self.snapshot = InputSnapshot(
+            buttons,
+            buttons & ~previous,
+            previous & ~buttons,
+            tuple(round(value, 1) for value in self.axes),
+            (hat_x, hat_y),
+            (left_trigger, right_trigger),
+        )
+        self.tapped_buttons = 0
+
+    def _edge_mask(self, just_pressed: bool, just_released: bool) -> int:
+        if just_pressed:
+            return self.snapshot.pressed
+        elif just_released:
+            return self.snapshot.released
+        return self.snapshot.buttons
 
     def get_joystick(self, joystick: int) -> tuple[float, float]:
-        if self.loaded:
-            return round(self.controller.get_axis(joystick), 1), round(self.controller.get_axis(joystick+1), 1)
-        else:
-            return 0.0, 0.0
+        axes = self.snapshot.axes
+        return axes[joystick], axes[joystick+1]
 
     def get_dpad(self) -> tuple[float, float]:
-        if self.loaded:
-            return self.current_dpad
-        else:
-            return 0, 0
+        return self.snapshot.dpad
 
     def get_dpad_as_btn(self, just_pressed: bool = False, just_released: bool = False) -> tuple[bool, bool, bool, bool]:
-        if self.loaded:
-            if just_pressed:
-                out = (
-                    self.current_dpad[1]>0 and not self.previous_dpad[1]>0,
-                    self.current_dpad[1]<0 and not self.previous_dpad[1]<0,
-                    self.current_dpad[0]<0 and not self.previous_dpad[0]<0,
-                    self.current_dpad[0]>0 and not self.previous_dpad[0]>0
-                )
-            elif just_released:
-                out = (
-                    not self.current_dpad[1]>0 and self.previous_dpad[0],
-                    not self.current_dpad[1]<0 and self.previous_dpad[1],
-                    not self.current_dpad[0]<0 and self.previous_dpad[2],
-                    not self.current_dpad[0]>0 and self.previous_dpad[3]
-                )
-            else:
-                out = (self.current_dpad[1]>0, self.current_dpad[1]<0, self.current_dpad[0]<0, self.current_dpad[0]>0)
-            return out
-        else:
-            return False, False, False, False
+        mask = self._edge_mask(just_pressed, just_released)
+        return bool(mask & DPAD_UP), bool(mask & DPAD_DOWN), bool(mask & DPAD_LEFT), bool(mask & DPAD_RIGHT)
 
     def get_button(self, button: int, just_pressed: bool = False, just_released: bool = False) -> bool:
-        if self.loaded:
-            if self.nintendo_mode:
-                match button:
-                    case 0: # A
-                        target_btn = 1 # B
-                    case 1: # B
-                        target_btn = 0 # A
-                    case 2: # X
-                        target_btn = 3 # Y
-                    case 3: # Y
-                        target_btn = 2 # X
-                    case _:
-                        target_btn = button # any button which doesn't change
-            else:
-                target_btn = button
-
-            if just_pressed:
-                return self.current_buttons[target_btn] and not self.previous_buttons[target_btn]
-            elif just_released:
-                return not self.current_buttons[target_btn] and self.previous_buttons[target_btn]
-            else:
-                return self.current_buttons[target_btn]
-        else:
-            return False
-    
+        return bool(self._edge_mask(just_pressed, just_released) & self.button_masks[button])
+
     def get_trigger(self, trigger: int) -> float:
-        if self.loaded:
-            return self.current_triggers[trigger]
-        else:
-            return 0
-    
+        return self.snapshot.triggers[trigger]
+
     def get_trigger_as_btn(self, trigger: int, just_pressed: bool = False, just_released: bool = False) -> bool:
-        if self.loaded:
-            if just_pressed:
-                return self.current_triggers[trigger]>0.5 and not self.previous_triggers[trigger]>0.5
-            elif just_released:
-                return not self.current_triggers[trigger]>0.5 and self.previous_triggers[trigger]>0.5
-            else:
-                return self.current_triggers[trigger]>0.5
-        else:
-            return False
-        
+        return bool(self._edge_mask(just_pressed, just_released) & TRIGGER_BITS[trigger])
+
     def get_direction(self, joystick: int):
-        joy_value = self.get_joystick(joystick)
-        dpad_value = self.get_dpad()
-        return (joy_value[0]+dpad_value[0], joy_value[1]+dpad_value[1]*-1)
-    
+        axes = self.snapshot.axes
+        dpad = self.snapshot.dpad
+        return (axes[joystick]+dpad[0], axes[joystick+1]+dpad[1]*-1)
+
     def get_proceed_button(self, just_pressed: bool = False, just_released: bool = False):
-        a = self.get_button(self.a, just_pressed=just_pressed, just_released=just_released) if self.a_proceeds else False
-        b = self.get_button(self.b, just_pressed=just_pressed, just_released=just_released) if self.b_proceeds else False
-        return a or b
\ No newline at end of file
+        mask = self._edge_mask(just_pressed, just_released)
+        return bool(mask & ((self.button_masks[self.a] if self.a_proceeds else 0) | (self.button_masks[self.b] if self.b_proceeds else 0)))
+
+class VirtualController(Controller):
+    # a controller that's always connected and takes its state from code instead of a device,
+    # for replays and bots
+
+    def __init__(self) -> None:
+        super().__init__(None)
+        self.loaded = True
+        self.instance_id = -1
+
+    def handle_event(self, event: pygame.Event) -> None:
+        pass
+
+    def set_state(self, held_buttons: int, tapped_buttons: int = 0, hat: tuple[int, int] = (0, 0), axes: list[float] | None = None) -> None:
+        self.held_buttons = held_buttons
+        self.tapped_buttons = tapped_buttons
+        self.hat = hat
+        if axes is not None:
+            self.axes = axes
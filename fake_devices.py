@@ -0,0 +1,152 @@
+# stand-ins for the arduino, so the lighting backends can be run without the cabinet
+# each device opens a pty pair: the backend opens `device.path` like a real serial port,
+# and everything it writes is recorded with a timestamp on the other end
+#   python fake_devices.py
+
+import os
+import select
+import tty
+from threading import Event, Thread
+from time import monotonic
+
+READ_SIZE = 1024
+POLL_INTERVAL = 0.01
+
+class FakeSerialDevice:
+
+    def __init__(self, chatter: bytes = b"") -> None:
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave) # no line discipline, bytes go through exactly as written
+        self.path = os.ttyname(self.slave)
+        self.chatter = chatter # written back every poll, like the firmware spamming its mode
+        self.received: list[tuple[float, bytes]] = [] # monotonic timestamp (same clock as the lighting timelines), chunk
+        self.start_time = monotonic()
+        self._stop = Event()
+        self._thread = Thread(target=self._read_loop, name="fake_serial", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self.master], [], [], POLL_INTERVAL)
+            if readable:
+                try:
+                    data = os.read(self.master, READ_SIZE)
+                except OSError:
+                    break
+                self.handle(monotonic(), data)
+            if self.chatter:
+                try:
+                    os.write(self.master, self.chatter)
+                except OSError:
+                    pass
+
+    def handle(self, timestamp: float, data: bytes):
+        self.received.append((timestamp, data))
+
+    def data(self) -> bytes:
+        return b"".join(chunk for _, chunk in self.received)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class FakeLightcycleDevice(FakeSerialDevice):
+    # decodes the lightcycle_rv2.ino protocol, a single '0'+mode character per mode change
+
+    def __init__(self) -> None:
+        super().__init__(chatter=b"\x00")
+        self.modes: list[tuple[float, int]] = []
+
+    def handle(self, timestamp: float, data: bytes):
+        super().handle(timestamp, data)
+        for byte in data:
+            self.modes.append((timestamp, byte - ord("0")))
+
+
+# firmata commands the fake board understands, with the bytes each one takes including the command byte
+DIGITAL_MESSAGE = 0x90
+REPORT_ANALOG = 0xC0
+REPORT_DIGITAL = 0xD0
+ANALOG_MESSAGE = 0xE0
+START_SYSEX = 0xF0
+END_SYSEX = 0xF7
+SET_PIN_MODE = 0xF4
+REPORT_VERSION = 0xF9
+SYSTEM_RESET = 0xFF
+FIRMATA_COMMAND_SIZES = {DIGITAL_MESSAGE: 3, REPORT_ANALOG: 2, REPORT_DIGITAL: 2, ANALOG_MESSAGE: 3, SET_PIN_MODE: 3, REPORT_VERSION: 3, SYSTEM_RESET: 1}
+
+class FakeFirmataDevice(FakeSerialDevice):
+    # keeps the pin modes and output levels a StandardFirmata board would end up with
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.pin_modes: dict[int, int] = {}
+        self.ports: dict[int, int] = {} # port number -> 8 bit output levels
+        self.messages: list[tuple[float, int, bytes]] = [] # timestamp, command, whole message
+        self.pin_changes: list[tuple[float, int, bool]] = [] # timestamp, pin, level
+        super().__init__()
+
+    def handle(self, timestamp: float, data: bytes):
+        super().handle(timestamp, data)
+        self.buffer += data
+        while self.buffer:
+            first = self.buffer[0]
+            if first == START_SYSEX:
+                end = self.buffer.find(END_SYSEX)
+                if end < 0:
+                    return
+                size = end + 1
+            elif first < 0x80:
+                # stray data byte, a real board drops these too
+                del self.buffer[0]
+                continue
+            else:
+                command = first & 0xF0 if first < START_SYSEX else first
+                size = FIRMATA_COMMAND_SIZES.get(command, 1)
+                if len(self.buffer) < size:
+                    return
+            message = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self.apply(timestamp, message)
+
+    def apply(self, timestamp: float, message: bytes):
+        first = message[0]
+        command = first & 0xF0 if first < START_SYSEX else first
+        self.messages.append((timestamp, command, message))
+        if command == SET_PIN_MODE:
+            self.pin_modes[message[1]] = message[2]
+        elif command == DIGITAL_MESSAGE:
+            port = first & 0x0F
+            levels = message[1] | (message[2] << 7)
+            changed = levels ^ self.ports.get(port, 0)
+            self.ports[port] = levels
+            for bit in range(8):
+                if changed & (1 << bit):
+                    self.pin_changes.append((timestamp, port*8 + bit, bool(levels & (1 << bit))))
+
+    def pin(self, pin: int) -> bool:
+        return bool(self.ports.get(pin // 8, 0) & (1 << pin % 8))
+
+
+if __name__ == "__main__":
+    from time import sleep
+    import lighting_mc
+
+    device = FakeLightcycleDevice()
+    lights = lighting_mc.FirmwareLightingMC(device.path, boot_time=0)
+    lights.ready.wait()
+    for mode in (lighting_mc.MENU_MUSIC_FLASH, lighting_mc.FAST_CYCLE, lighting_mc.FAST_CYCLE, lighting_mc.FAST_FLASH, lighting_mc.ALL_OFF):
+        lights.set_mode(mode)
+        for _ in range(30):
+            lights.update()
+            sleep(1/60)
+    lights.close()
+    sleep(POLL_INTERVAL*2)
+    device.close()
+
+    for timestamp, mode in device.modes:
+        print(f"[fake_devices] {timestamp-device.start_time:7.3f}s  mode {mode}")
+    print(f"[fake_devices] {len(device.data())} bytes received, host sent {lights.serial_stats()['bytes_sent']}")
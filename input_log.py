@@ -0,0 +1,102 @@
+# fixed width binary log of everything a session fed into the simulation, one record per frame
+# written by main.py when INPUT_LOG_DIR is set, read back by replay.py
+#
+# header: magic, version, record size, rng seed
+# record: frame time in microseconds, held and tapped buttons, hat, the six raw axes as int16,
+#         and a flags byte for the cast/left/right keys and a pending cast tap
+
+import os
+import struct
+from datetime import datetime
+from typing import Iterator
+
+from minigames import CAST_KEY, LEFT_KEY, RIGHT_KEY
+
+MAGIC = b"UFGI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<IHHbb6hB")
+WRITE_BUFFER = 64 * 1024
+READ_RECORDS = 4096 # records per read when streaming a log back
+
+AXIS_SCALE = 32767 # sdl reports axes as int16/32767, so this round trips exactly
+
+# flag bits
+RECORDED_KEYS = (CAST_KEY, LEFT_KEY, RIGHT_KEY)
+CAST_TAPPED_FLAG = 1 << len(RECORDED_KEYS)
+
+class RecordedKeys:
+    # stands in for pygame.key.get_pressed() during a replay, only knows the keys that were recorded
+    __slots__ = ("flags",)
+
+    def __init__(self, flags: int = 0) -> None:
+        self.flags = flags
+
+    def __getitem__(self, key: int) -> bool:
+        try:
+            return bool(self.flags & (1 << RECORDED_KEYS.index(key)))
+        except ValueError:
+            return False
+
+class InputRecorder:
+
+    def __init__(self, path: str, seed: int) -> None:
+        self.path = path
+        self.file = open(path, "wb", buffering=WRITE_BUFFER)
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, seed))
+        self.frames = 0
+
+    @classmethod
+    def in_directory(cls, directory: str, seed: int) -> "InputRecorder":
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, datetime.now().strftime("inputs_%Y%m%d_%H%M%S.bin")), seed)
+
+    def record(self, frame_time: float, controller, keys, cast_key_tapped: bool):
+        flags = CAST_TAPPED_FLAG if cast_key_tapped else 0
+        for bit, key in enumerate(RECORDED_KEYS):
+            if keys[key]:
+                flags |= 1 << bit
+        self.file.write(RECORD.pack(
+            round(frame_time * 1_000_000),
+            controller.held_buttons,
+            controller.tapped_buttons,
+            *controller.hat,
+            *(round(value * AXIS_SCALE) for value in controller.axes),
+            flags,
+        ))
+        self.frames += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            print(f"[input_log] wrote {self.frames} frames to {self.path}")
+
+class InputLog:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, record_size, self.seed = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a version {VERSION} input log")
+        self.frames = (os.path.getsize(path) - HEADER.size) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __iter__(self) -> Iterator[tuple]:
+        # streams the log in chunks, so a day of play never has to fit in memory
+        with open(self.path, "rb") as f:
+            f.seek(HEADER.size)
+            while chunk := f.read(RECORD.size * READ_RECORDS):
+                # a crash can leave half a record at the end
+                yield from RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size])
+
+    @staticmethod
+    def apply(record: tuple, game) -> float:
+        # puts one frame's recorded input into the game, returns the frame time to run it with
+        frame_time, held, tapped, hat_x, hat_y, *axes, flags = record
+        game.controller.set_state(held, tapped, (hat_x, hat_y), [value / AXIS_SCALE for value in axes])
+        game.keys = RecordedKeys(flags)
+        game.cast_key_tapped = bool(flags & CAST_TAPPED_FLAG)
+        return frame_time / 1_000_000
@@ -0,0 +1,159 @@
+# runs every lighting mode against a fake firmata board and measures what actually reaches it
+# usage:
+#   python lighting_benchmark.py -o lighting_output.json --seconds 5
+# latency is how late each led change arrived compared to when the mode's timeline says it should
+# have happened, jitter is the standard deviation of that
+
+import argparse
+import json
+import statistics
+import sys
+from time import monotonic, sleep
+
+import pyfirmata2
+import lighting_mc
+from fake_devices import DIGITAL_MESSAGE, FakeFirmataDevice
+
+DEFAULT_SECONDS = 3.0
+DEFAULT_FPS = 60
+SETTLE_TIME = 0.05 # let the io thread and the pty catch up before reading the results
+MATCH_TOLERANCE = 0.001 # how early a change may show up and still count for a transition
+
+# the fake board is ready immediately, there's no bootloader to wait for
+pyfirmata2.pyfirmata2.BOARD_SETUP_WAIT_TIME = 0
+
+
+def led_mask(ports: dict[int, int]) -> int:
+    mask = 0
+    for bit, pin in lighting_mc.LED_PINS.items():
+        if ports.get(pin // 8, 0) & (1 << pin % 8):
+            mask |= bit
+    return mask
+
+
+def observed_changes(device: FakeFirmataDevice, start: float, end: float, initial_mask: int) -> list[tuple[float, int]]:
+    ports = {}
+    changes = []
+    mask = initial_mask
+    for timestamp, command, message in list(device.messages):
+        if command != DIGITAL_MESSAGE:
+            continue
+        ports[message[0] & 0x0F] = message[1] | (message[2] << 7)
+        if not start <= timestamp < end:
+            continue
+        new_mask = led_mask(ports)
+        if new_mask != mask:
+            changes.append((timestamp, new_mask))
+            mask = new_mask
+    return changes
+
+
+def expected_changes(timeline: lighting_mc.Timeline, start: float, end: float, initial_mask: int) -> list[tuple[float, int]]:
+    changes = []
+    mask = initial_mask
+    step = 0
+    while start + timeline.start_of(step) < end:
+        new_mask = timeline.masks[step % len(timeline.masks)]
+        if new_mask != mask:
+            changes.append((start + timeline.start_of(step), new_mask))
+            mask = new_mask
+        step += 1
+    return changes
+
+
+def match_latencies(expected: list[tuple[float, int]], observed: list[tuple[float, int]]) -> tuple[list[float], int]:
+    # pairs every intended change with the first later observed change to the same leds
+    latencies = []
+    missed = 0
+    idx = 0
+    for expected_time, mask in expected:
+        found = None
+        for candidate in range(idx, len(observed)):
+            observed_time, observed_mask = observed[candidate]
+            if observed_mask == mask and observed_time >= expected_time - MATCH_TOLERANCE:
+                found = candidate
+                break
+        if found is None:
+            missed += 1
+            continue
+        latencies.append(observed[found][0] - expected_time)
+        idx = found + 1
+    return latencies, missed
+
+
+def run_mode(lights: lighting_mc.LightingMC, device: FakeFirmataDevice, mode: int, seconds: float, fps: int) -> dict:
+    sleep(SETTLE_TIME)
+    initial_mask = led_mask(device.ports)
+    first_message = len(device.messages)
+    first_chunk = len(device.received)
+
+    lights.set_mode(mode)
+    start = lights.mode_start_time
+    end = start + seconds
+    next_frame = monotonic()
+    while next_frame < end:
+        lights.update()
+        next_frame += 1/fps
+        sleep(max(0.0, next_frame - monotonic()))
+    sleep(SETTLE_TIME)
+
+    messages = [message for timestamp, _, message in device.messages[first_message:] if timestamp < end]
+    byte_count = sum(len(chunk) for timestamp, chunk in device.received[first_chunk:] if timestamp < end)
+    expected = expected_changes(lights.timeline, start, end, initial_mask)
+    observed = observed_changes(device, start, end, initial_mask)
+    latencies, missed = match_latencies(expected, observed)
+    latencies_ms = sorted(latency*1000 for latency in latencies)
+    return {
+        "messages_per_second": round(len(messages)/seconds, 2),
+        "bytes_per_second": round(byte_count/seconds, 2),
+        "transitions_expected": len(expected),
+        "transitions_observed": len(observed),
+        "transitions_missed": missed,
+        "latency_mean_ms": round(statistics.fmean(latencies_ms), 3) if latencies_ms else None,
+        "latency_p95_ms": round(latencies_ms[min(len(latencies_ms)-1, round(0.95*(len(latencies_ms)-1)))], 3) if latencies_ms else None,
+        "latency_max_ms": round(latencies_ms[-1], 3) if latencies_ms else None,
+        "jitter_ms": round(statistics.pstdev(latencies_ms), 3) if len(latencies_ms) > 1 else None,
+    }
+
+
+def run(seconds: float, fps: int, modes: list[int] | None = None) -> dict:
+    device = FakeFirmataDevice()
+    lights = lighting_mc.LightingMC(device.path)
+    lights.ready.wait()
+    results = {}
+    try:
+        for mode in modes if modes is not None else sorted(lighting_mc.MODES):
+            stats = run_mode(lights, device, mode, seconds, fps)
+            results[str(mode)] = stats
+            latency = f"{stats['latency_mean_ms']:7.2f} ms" if stats["latency_mean_ms"] is not None else "      -   "
+            jitter = f"{stats['jitter_ms']:6.2f} ms" if stats["jitter_ms"] is not None else "     -   "
+            print(f"[lighting_benchmark] mode {mode:2}  {stats['messages_per_second']:6.1f} msg/s  {stats['bytes_per_second']:6.1f} B/s  latency {latency}  jitter {jitter}  missed {stats['transitions_missed']}", file=sys.stderr)
+    finally:
+        lights.close()
+        device.close()
+    return {
+        "version": 1,
+        "seconds": seconds,
+        "fps": fps,
+        "backend": type(lights).__name__,
+        "modes": results,
+    }
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Lighting throughput and timing benchmark against a fake firmata board")
+    parser.add_argument("-o", "--output", default="lighting_output.json")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="how long to run each mode")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS, help="how often update() is called")
+    parser.add_argument("--modes", type=int, nargs="*", help="only run these modes")
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.fps, args.modes)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[lighting_benchmark] wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -8,7 +8,11 @@
 # or anything that'd keep it actually in sync with the other parts of the game)
 
 import pyfirmata2, serial
-from time import time
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+from threading import Event, Thread
+from time import monotonic, time
 from typing import Callable
 
 ALL_OFF = 0
@@ -29,164 +33,368 @@ MENU_MUSIC_FLASH = 14
 END_MUSIC_FLASH = 15
 GAME_MUSIC_FLASH = 16
 
+RED_LED = 1
+BLUE_LED = 2
+YELLOW_LED = 4
+ALL_LEDS = RED_LED | BLUE_LED | YELLOW_LED
+LED_PINS = {RED_LED: 9, BLUE_LED: 10, YELLOW_LED: 11} # digital pins on the arduino
+
+DIGITAL_MESSAGE_SIZE = 3 # bytes in a firmata digital port message
+
+IO_INTERVAL = 0.005 # longest the io thread sleeps between serial reads, and the most a led change waits to be sent
+CLOSE_TIMEOUT = 1.0
+
+# lightcycle_rv2.ino runs modes 0-13 itself and takes a single '0'+mode character per change
+FIRMWARE_BAUD = 9600
+FIRMWARE_MODES = 14
+FIRMWARE_BOOT_TIME = 2.0 # opening the port resets the arduino, anything sent while the bootloader runs is lost
+# the music flashes have no firmware equivalent, slow flash is the closest thing it has
+FIRMWARE_MODE_FALLBACKS = {
+    MENU_MUSIC_FLASH: SLOW_FLASH,
+    END_MUSIC_FLASH: SLOW_FLASH,
+    GAME_MUSIC_FLASH: SLOW_FLASH,
+}
+
 def nop(*args, **kwargs):
     pass
 
+class Timeline:
+    # a mode is a loop of (seconds, led bitmask) steps, compiled once so looking up the current
+    # step is a divmod and a bisect over a handful of floats
+
+    def __init__(self, steps: list[tuple[float, int]]) -> None:
+        if not steps or any(duration <= 0 for duration, _ in steps):
+            raise ValueError("a timeline needs at least one step and every step needs a positive duration")
+        self.durations = [duration for duration, _ in steps]
+        self.masks = [mask for _, mask in steps]
+        self.ends = list(accumulate(self.durations)) # when each step ends, relative to the start of a loop
+        self.period = self.ends[-1]
+
+    @classmethod
+    def from_bpm(cls, bpm: float, masks: list[int], beats_per_step: float = 1) -> "Timeline":
+        return cls([(60/bpm * beats_per_step, mask) for mask in masks])
+
+    def step_at(self, elapsed: float) -> int:
+        # how many steps in we are, counting across loops
+        loops, into_loop = divmod(elapsed, self.period)
+        return int(loops)*len(self.masks) + min(bisect_right(self.ends, into_loop), len(self.masks)-1)
+
+    def start_of(self, step: int) -> float:
+        loops, idx = divmod(step, len(self.masks))
+        return loops*self.period + (self.ends[idx-1] if idx else 0.0)
+
+    def mask_at(self, elapsed: float) -> int:
+        return self.masks[self.step_at(elapsed) % len(self.masks)]
+
+MODES: dict[int, Timeline] = {}
+
+def register_mode(timeline: Timeline, mode: int | None = None) -> int:
+    # returns the mode number to pass to set_mode(), picking the next free one if none is given
+    if mode is None:
+        mode = max(MODES, default=-1) + 1
+    MODES[mode] = timeline
+    return mode
+
+# the single colour modes still tick every 0.1s, so queued callbacks can be used as a delay
+register_mode(Timeline([(0.1, 0)]), ALL_OFF)
+register_mode(Timeline([(0.1, ALL_LEDS)]), ALL_ON)
+register_mode(Timeline([(0.1, RED_LED)]), RED_ONLY)
+register_mode(Timeline([(0.1, BLUE_LED)]), BLUE_ONLY)
+register_mode(Timeline([(0.1, YELLOW_LED)]), YELLOW_ONLY)
+for _speed, _step in enumerate((0.25, 0.5, 0.75)):
+    register_mode(Timeline([(_step, RED_LED), (_step, BLUE_LED), (_step, YELLOW_LED)]), FAST_CYCLE+_speed)
+# the inverse cycles have always stepped at 0.25s * (mode-4), so they run slower than the forward ones
+for _speed, _step in enumerate((1.0, 1.25, 1.5)):
+    register_mode(Timeline([(_step, RED_LED), (_step, YELLOW_LED), (_step, BLUE_LED)]), FAST_INVERSE_CYCLE+_speed)
+for _speed, _step in enumerate((0.1, 0.2, 0.3)):
+    register_mode(Timeline([(_step, 0), (_step, ALL_LEDS)]), FAST_FLASH+_speed)
+# flashing on the beat of each track
+register_mode(Timeline.from_bpm(105, [ALL_LEDS, 0]), MENU_MUSIC_FLASH)
+register_mode(Timeline.from_bpm(105, [ALL_LEDS, 0]), END_MUSIC_FLASH)
+register_mode(Timeline.from_bpm(110, [ALL_LEDS, 0]), GAME_MUSIC_FLASH)
+
 class LightingMC:
 
-    def __init__(self, tty: str = "/dev/ttyACM0") -> None:
+    def __init__(self, tty: str | None = "/dev/ttyACM0") -> None:
+        self.disable = tty is None
+        self.ready = Event() # set once the io thread has opened the board, or given up on it
+
+        # last state written to the board, as a bitmask of the *_LED constants (-1 is unknown)
+        self.led_mask = -1
+        # the io thread owns the board. the game thread only ever drops the newest led state in this
+        # single-slot mailbox and wakes the thread up, so serial stalls never reach the frame
+        self.pending_mask = -1
+        self._wake = Event()
+        self._stop = Event()
+        self._io_thread: Thread | None = None
+
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.messages_per_second = 0.0
+        self.bytes_per_second = 0.0
+        self._stats_window_start = time()
+        self._stats_window_messages = 0
+        self._stats_window_bytes = 0
+
+        if self.disable:
+            self.ready.set()
+        else:
+            # opening the board can take seconds (pyfirmata2 waits out the bootloader, an unplugged one
+            # has to time out), so that happens on the io thread too and startup never waits for it
+            self._io_thread = Thread(target=self._run_io, args=(tty,), name="lighting_io", daemon=True)
+            self._io_thread.start()
+
+        self.sequenced_callbacks: deque[Callable | int | None] = deque()
+        self._start_mode(ALL_OFF, monotonic())
+
+        print("[lighting_mc] initialized")
+
+    def connect(self, tty: str) -> bool:
         try:
             self.board = pyfirmata2.Arduino(tty)
-            self.disable = False
         except serial.SerialException:
             print("[lighting_mc] arduino connection error, lights disabled")
-            self.disable = True
+            return False
         except AttributeError:
             print("[lighting_mc] arduino connection error, lights disabled")
+            return False
+        return True
+
+    def setup_outputs(self):
+        self.red = self.board.get_pin(f"d:{LED_PINS[RED_LED]}:o")
+        self.blue = self.board.get_pin(f"d:{LED_PINS[BLUE_LED]}:o")
+        self.yellow = self.board.get_pin(f"d:{LED_PINS[YELLOW_LED]}:o")
+        self.leds = ((RED_LED, self.red), (BLUE_LED, self.blue), (YELLOW_LED, self.yellow))
+        self.board.sp.timeout = IO_INTERVAL # so iterate() can't block the io thread forever
+
+    def set_leds(self, red: bool, blue: bool, yellow: bool):
+        self.write_leds((RED_LED if red else 0) | (BLUE_LED if blue else 0) | (YELLOW_LED if yellow else 0))
+
+    def write_leds(self, mask: int):
+        if self.disable or mask == self.pending_mask:
+            return
+        self.pending_mask = mask
+        self._wake.set()
+
+    def _run_io(self, tty: str):
+        if not self.connect(tty):
             self.disable = True
-    
-        if not self.disable:
-            self.red = self.board.get_pin("d:9:o")
-            self.blue = self.board.get_pin("d:10:o")
-            self.yellow = self.board.get_pin("d:11:o")
-            self.set_leds(False, False, False)
+            self.ready.set()
+            return
+        if self._stop.is_set():
+            # closed while the board was still opening, so nobody else is going to release it
+            self._release_board()
+            self.ready.set()
+            return
+        self.setup_outputs()
+        self.ready.set()
+        # whatever the game set while the board was opening is still in the mailbox, and goes out first
+        self._io_loop()
 
-        self.mode = 0
-        self.state = 0
-        self.sequenced_callbacks: list[Callable | int | None] = []
+    def _io_loop(self):
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(IO_INTERVAL)
+                self._wake.clear()
+                # newer states overwrite older ones in the mailbox, so a burst of changes coalesces into one write
+                self.flush()
+                self.drain()
+            self.flush()
+        except (serial.SerialException, OSError, TypeError) as e:
+            # TypeError is pyfirmata2 choking on a read that timed out halfway through a message
+            print(f"[lighting_mc] lost the arduino ({e}), lights disabled")
+            self.disable = True
+        # this thread owns the board, so it's the one that lets go of it, after its last write
+        self._release_board()
 
-        print("[lighting_mc] initialized")
+    def _release_board(self):
+        try:
+            self.release()
+        except (serial.SerialException, OSError):
+            pass
 
-        self.last_state_change_time = time()
+    def flush(self):
+        self._write_pins(self.pending_mask)
 
-    def set_leds(self, red: bool, blue: bool, yellow: bool):
-        if self.disable:
+    def drain(self):
+        while self.board.bytes_available():
+            self.board.iterate()
+
+    def release(self):
+        self.board.exit()
+
+    def _write_pins(self, mask: int):
+        # only touches the pins that changed, and sends one message per port instead of one per pin
+        if mask < 0 or mask == self.led_mask:
+            return
+        changed = mask ^ self.led_mask if self.led_mask >= 0 else ALL_LEDS
+        ports = []
+        for bit, pin in self.leds:
+            if changed & bit:
+                pin.value = 1 if mask & bit else 0
+                if pin.port is None:
+                    pin.write(pin.value)
+                    self.count_message(DIGITAL_MESSAGE_SIZE)
+                elif pin.port not in ports:
+                    ports.append(pin.port)
+        for port in ports:
+            port.write()
+            self.count_message(DIGITAL_MESSAGE_SIZE)
+        self.led_mask = mask
+
+    def count_message(self, size: int):
+        self.messages_sent += 1
+        self.bytes_sent += size
+
+    def update_serial_stats(self):
+        elapsed = time() - self._stats_window_start
+        if elapsed < 1:
             return
-        self.red.write(1 if red else 0)
-        self.blue.write(1 if blue else 0)
-        self.yellow.write(1 if yellow else 0)
+        self.messages_per_second = (self.messages_sent - self._stats_window_messages) / elapsed
+        self.bytes_per_second = (self.bytes_sent - self._stats_window_bytes) / elapsed
+        self._stats_window_start += elapsed
+        self._stats_window_messages = self.messages_sent
+        self._stats_window_bytes = self.bytes_sent
+
+    def close(self):
+        # stops the io thread, which flushes the last led state and releases the board on its way out.
+        # one stuck in a slow write is left to finish (and release) on its own instead of racing it here
+        if self._io_thread:
+            self._stop.set()
+            self._wake.set()
+            self._io_thread.join(CLOSE_TIMEOUT)
+            if self._io_thread.is_alive():
+                print("[lighting_mc] io thread didn't stop in time, it'll release the board when it does")
+            self._io_thread = None
+        self.disable = True
+
+    def serial_stats(self) -> dict[str, float]:
+        return {
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "messages_per_second": round(self.messages_per_second, 1),
+            "bytes_per_second": round(self.bytes_per_second, 1),
+        }
 
     def set_mode(self, mode: int):
-        if mode > -1 and mode < 17:
-            self.mode = mode
-            self.state = 0
-            self.last_state_change_time = time()
+        if mode in MODES:
+            self._start_mode(mode, monotonic())
+
+    def _start_mode(self, mode: int, start_time: float):
+        self.mode = mode
+        self.timeline = MODES[mode]
+        self.mode_start_time = start_time
+        self.step = 0
+        self.state = 0
 
     def add_sequenced_callback(self, callback: Callable | int | None, next: bool = False):
         if next:
-            self.sequenced_callbacks.insert(0, callback)
+            self.sequenced_callbacks.appendleft(callback)
         else:
             self.sequenced_callbacks.append(callback)
     
     def bulk_add_sequenced_callbacks(self, callbacks: list[Callable | int | None], next: bool = False):
         if next:
-            callbacks.extend(self.sequenced_callbacks.copy())
-            self.sequenced_callbacks = callbacks
+            self.sequenced_callbacks.extendleft(reversed(callbacks))
         else:
             self.sequenced_callbacks.extend(callbacks)
 
     def clear_sequenced_callbacks(self):
-        self.sequenced_callbacks = []
-
-    def trigger_state_change(self, highest_state: int, inverse_direction: bool = False):
-        self.state += -1 if inverse_direction else 1
-        if self.state > highest_state:
-            self.state = 0
-        if self.state < 0:
-            self.state = highest_state
-        self.last_state_change_time = time()
-        try:
-            callback = self.sequenced_callbacks.pop(0)
+        self.sequenced_callbacks.clear()
+
+    def update(self):
+        #self.board.iterate() # THIS LINE IS VERY IMPORTANT BUT IT BLOCKS THE ENTIRE F***ING PROJECT I NEED SLEEP HELP ME PLEASE
+        self.update_serial_stats()
+
+        now = monotonic()
+        # every step boundary hands out one queued callback. boundaries are computed from when the mode
+        # started rather than from when the last frame noticed them, so late frames never add drift
+        while self.sequenced_callbacks:
+            boundary = self.mode_start_time + self.timeline.start_of(self.step+1)
+            if boundary > now:
+                break
+            self.step += 1
+            callback = self.sequenced_callbacks.popleft()
             if isinstance(callback, int):
-                self.mode = callback
+                if callback in MODES:
+                    self._start_mode(callback, boundary)
             elif isinstance(callback, Callable):
                 callback(self)
-        except IndexError:
-            pass
+        else:
+            self.step = self.timeline.step_at(now - self.mode_start_time)
+
+        self.state = self.step % len(self.timeline.masks)
+        self.write_leds(self.timeline.masks[self.state])
+
+
+class FirmwareLightingMC(LightingMC):
+    # lets lightcycle_rv2.ino run the cycles and flashes on the arduino, so a mode change is one byte
+    # instead of a pin write every step. the host still walks the same timeline so sequenced callbacks
+    # keep firing, it just never sends the individual led states
+
+    def __init__(self, tty: str | None = "/dev/ttyACM0", boot_time: float = FIRMWARE_BOOT_TIME) -> None:
+        self.boot_time = boot_time
+        self.firmware_mode = -1 # last mode sent to the board
+        self.pending_firmware_mode = -1
+        super().__init__(tty)
+
+    def connect(self, tty: str) -> bool:
+        try:
+            self.port = serial.Serial(tty, FIRMWARE_BAUD, timeout=0, write_timeout=CLOSE_TIMEOUT)
+        except (serial.SerialException, OSError):
+            print("[lighting_mc] arduino connection error, lights disabled")
+            return False
+        return True
+
+    def setup_outputs(self):
+        pass # the firmware boots with its leds off and keeps its own pin state
+
+    def write_leds(self, mask: int):
+        pass
+
+    def write_mode(self, mode: int):
+        mode = FIRMWARE_MODE_FALLBACKS.get(mode, mode)
+        if self.disable or mode == self.pending_firmware_mode or not 0 <= mode < FIRMWARE_MODES:
+            return
+        self.pending_firmware_mode = mode
+        self._wake.set()
+
+    def _io_loop(self):
+        # sleep through the bootloader here so the game thread never waits on it
+        if self._stop.wait(self.boot_time):
+            self._release_board()
+            return
+        super()._io_loop()
+
+    def flush(self):
+        mode = self.pending_firmware_mode
+        if mode < 0 or mode == self.firmware_mode:
+            return
+        self.port.write(bytes([ord("0") + mode]))
+        self.count_message(1)
+        self.firmware_mode = mode
+
+    def drain(self):
+        # the firmware echoes its mode every loop, nothing in there is worth reading
+        if self.port.in_waiting:
+            self.port.reset_input_buffer()
+
+    def release(self):
+        self.port.close()
 
     def update(self):
-        #self.board.iterate() # THIS LINE IS VERY IMPORTANT BUT IT BLOCKS THE ENTIRE F***ING PROJECT I NEED SLEEP HELP ME PLEASE
+        # callbacks can switch self.mode without going through set_mode, so pick the change up here
+        super().update()
+        self.write_mode(self.mode)
 
-        match self.mode:
-            case 0:
-                self.set_leds(False, False, False)
-                if time()-self.last_state_change_time > 0.1:
-                    self.trigger_state_change(0)
-            case 1:
-                self.set_leds(True, True, True)
-                if time()-self.last_state_change_time > 0.1:
-                    self.trigger_state_change(0)
-            case 2:
-                self.set_leds(True, False, False)
-                if time()-self.last_state_change_time > 0.1:
-                    self.trigger_state_change(0)
-            case 3:
-                self.set_leds(False, True, False)
-                if time()-self.last_state_change_time > 0.1:
-                    self.trigger_state_change(0)
-            case 4:
-                self.set_leds(False, False, True)
-                if time()-self.last_state_change_time > 0.1:
-                    self.trigger_state_change(0)
-            case 5:
-                self._update_cycle()
-            case 6:
-                self._update_cycle()
-            case 7:
-                self._update_cycle()
-            case 8:
-                self._update_cycle(inverse=True)
-            case 9:
-                self._update_cycle(inverse=True)
-            case 10:
-                self._update_cycle(inverse=True)
-            case 11:
-                self._update_flash()
-            case 12:
-                self._update_flash()
-            case 13:
-                self._update_flash()
-            case 14:
-                if time() - self.last_state_change_time > 0.571:
-                    self.trigger_state_change(1, False)
-                match self.state:
-                    case 0:
-                        self.set_leds(True, True, True)
-                    case 1:
-                        self.set_leds(False, False, False)
-            case 15:
-                if time() - self.last_state_change_time > 0.571:
-                    self.trigger_state_change(1, False)
-                match self.state:
-                    case 0:
-                        self.set_leds(True, True, True)
-                    case 1:
-                        self.set_leds(False, False, False)
-            case 16:
-                if time() - self.last_state_change_time > 0.545:
-                    self.trigger_state_change(1, False)
-                match self.state:
-                    case 0:
-                        self.set_leds(True, True, True)
-                    case 1:
-                        self.set_leds(False, False, False)
-
-    def _update_cycle(self, inverse: bool = False):
-        if time() - self.last_state_change_time > 0.250 * (self.mode-4):
-            self.trigger_state_change(2, inverse)
-        match self.state:
-            case 0:
-                self.set_leds(True, False, False)
-            case 1:
-                self.set_leds(False, True, False)
-            case 2:
-                self.set_leds(False, False, True)
-    
-    def _update_flash(self):
-        if time() - self.last_state_change_time > 0.100 * (self.mode-10):
-            self.trigger_state_change(1)
-        match self.state:
-            case 0:
-                self.set_leds(False, False, False)
-            case 1:
-                self.set_leds(True, True, True)
\ No newline at end of file
+
+LIGHTING_BACKENDS = {
+    "firmata": LightingMC,
+    "firmware": FirmwareLightingMC,
+}
+
+def make_lighting(backend: str = "firmata", tty: str | None = "/dev/ttyACM0") -> LightingMC:
+    if backend not in LIGHTING_BACKENDS:
+        print(f"[lighting_mc] unknown lighting backend {backend}, using firmata")
+        backend = "firmata"
+    return LIGHTING_BACKENDS[backend](tty)
@@ -1,8 +1,20 @@
 
+import os
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic, perf_counter
 import pygame
-from rendering_engine import RenderingEngine
+from rendering_engine import RenderingEngine, RenderAssets
 from lighting_mc import *
 from controller import Controller
+from input_log import InputRecorder
+from score_store import make_score_store
+from roster import Roster
+from resources import GameSnapshot, ResourceRegistry
+from timestep import FixedTimestep
+from profiling import FrameProfiler
+import profiling
 import minigames
 
 CAST_BTN_KEY = pygame.K_k
@@ -11,27 +23,82 @@ RIGHT_BTN_KEY = pygame.K_f
 
 FISH_CLOCK_FULL = 20
 
+DIRTY_RECTS = False # only redraw/present changed regions, for low-power cabinets
+
+PROFILER_OVERLAY_KEY = pygame.K_F3
+PROFILER_DUMP_KEY = pygame.K_F4
+
+# "firmata" drives every led from here, "firmware" sends mode changes to lightcycle_rv2.ino
+LIGHTING_BACKEND = os.environ.get("LIGHTING_BACKEND", "firmata")
+LIGHTING_TTY = os.environ.get("LIGHTING_TTY", "/dev/ttyACM0")
+
+# "journal" keeps high_scores.txt plus a journal, "sqlite" shares one database between every cabinet on the machine
+SCORE_BACKEND = os.environ.get("SCORE_BACKEND", "journal")
+HIGH_SCORES_FILE = os.environ.get("HIGH_SCORES_FILE", "high_scores.db" if SCORE_BACKEND == "sqlite" else "high_scores.txt")
+
+STARTUP_WORKERS = 3
+SPLASH_PUMP_INTERVAL = 0.05 # seconds between event pumps while startup stages finish
+
+ROSTER_PAGE = 10 # names skipped by the shoulder buttons in the name selector
+
+# after a crash the game is rebuilt around the already loaded resources, and by default picks up where it was
+RESTORE_AFTER_CRASH = os.environ.get("RESTORE_AFTER_CRASH", "1") != "0"
+COLD_RESTART_CRASHES = 3 # this many crashes within CRASH_WINDOW seconds falls back to a full restart
+CRASH_WINDOW = 30
+
+INPUT_LOG_DIR = os.environ.get("INPUT_LOG_DIR") # record every session here for replay.py
+
+SCENE_NAMES = {0: "game", 1: "end_menu", 2: "main_menu", 3: "tutorial", 4: "difficulty", 5: "minigame_tutorial", 6: "name_selector"}
+LATENCY_KEYS = (CAST_BTN_KEY, LEFT_BTN_KEY, RIGHT_BTN_KEY)
+
 class Game:
 
-    def __init__(self) -> None:
-        pygame.mixer.pre_init(44100)
-        pygame.init()
-        pygame.display.init()
+    def __init__(self, hardware: bool = True, names_file: str = "names.txt", high_scores_file: str = "high_scores.txt", controller: Controller | None = None, seed: int | None = None, input_log_dir: str | None = None, score_backend: str = "journal", resources: ResourceRegistry | None = None) -> None:
+        # everything random in the simulation comes from this seed, so a session can be replayed exactly
+        self.seed = seed if seed is not None else random.randrange(2**63)
+        random.seed(self.seed)
 
-        self.lighting = LightingMC()
+        self.startup_start = perf_counter()
+        self.startup_times: dict[str, float] = {} # seconds each startup stage took
+        self.first_frame_logged = False
 
-        self.screen: pygame.Surface = pygame.display.set_mode((640, 360), pygame.FULLSCREEN | pygame.SCALED | pygame.NOFRAME, 0, 0, 0)
-        pygame.display.set_caption("Untitled Fishing Game", "Untitled Fishing Game")
-        pygame.mouse.set_visible(False)
-        self.rendering_engine = RenderingEngine(self.screen, self.lighting)
-        self.controller = Controller(0)
+        # a game rebuilt after a crash gets everything below straight from the registry
+        self.resources = resources or ResourceRegistry()
+        self.screen: pygame.Surface = self.timed_stage("display", self.resources.get, "display", self.open_display)
+        self.profiler = FrameProfiler()
+        # the board opens on the lighting thread, so this doesn't wait on the arduino
+        self.lighting = self.timed_stage("lighting", self.resources.get, "lighting", make_lighting, LIGHTING_BACKEND, LIGHTING_TTY if hardware else None)
+
+        # decoding assets and reading the data files don't depend on each other, so they run side by side
+        # while the splash is up. joysticks stay on this thread with the rest of sdl's event handling
+        with ThreadPoolExecutor(max_workers=STARTUP_WORKERS, thread_name_prefix="startup") as pool:
+            stages = [
+                pool.submit(self.timed_stage, "assets", self.resources.get, "assets", RenderAssets),
+                pool.submit(self.timed_stage, "roster", self.resources.get, "roster", Roster.open, names_file),
+                pool.submit(self.timed_stage, "high_scores", self.resources.get, "high_scores", self.open_high_scores, score_backend, high_scores_file),
+            ]
+            self.controller = controller or self.timed_stage("controller", self.resources.get, "controller", Controller, 0 if hardware else None)
+            while wait(stages, SPLASH_PUMP_INTERVAL).not_done:
+                pygame.event.pump() # keeps the window responsive while the workers finish
+            assets, self.roster, self.high_scores = (stage.result() for stage in stages)
+        self.rendering_engine = self.timed_stage("rendering", RenderingEngine, self.screen, self.lighting, dirty_rects=DIRTY_RECTS, profiler=self.profiler, assets=assets)
+        self.rendering_engine.rng.seed(self.seed)
+        for name, seconds in self.startup_times.items():
+            print(f"[startup] {name} took {seconds*1000:.1f} ms")
+        print(f"[startup] ready in {(perf_counter()-self.startup_start)*1000:.0f} ms")
 
         self.clock = pygame.Clock()
-        self.delta = 0
+        self.timestep = FixedTimestep()
+        self.delta = self.timestep.step # the simulation always advances by exactly one step
+        self.frame_time = 0.0
+
+        self.keys = pygame.key.get_pressed()
+        self.cast_key_tapped = False # held until a simulation step sees it, so taps in frames without a step aren't lost
+        self.live_input = True # replays turn this off and set the input themselves
+        self.recorder = InputRecorder.in_directory(input_log_dir, self.seed) if input_log_dir else None
 
         self.running: bool = False
 
-        self.high_scores: list[tuple[str, float, str]] = [] # name, weight, difficulty
         self.score = 0
         self.fish_clock = FISH_CLOCK_FULL
         self.game_clock = 180
@@ -40,54 +107,149 @@ class Game:
 
         self.current_frame = None
         self.difficulty = 0
+        self.last_snapshot: GameSnapshot | None = None
 
-        with open("names.txt", "r") as f:
-            self.names_list = f.readlines()
-        self.names_list = [name.rstrip("\n") for name in self.names_list]
+        self.high_scores_file = high_scores_file
         self.chosen_name_idx = 0
-        try:
-            with open("high_scores.txt", "r") as f:
-                for line in f.readlines():
-                    split_line = line.split(" | ")
-                    self.high_scores.append((split_line[0], float(split_line[1]), split_line[2]))
-        except FileNotFoundError:
-            pass
+
+    def open_display(self) -> pygame.Surface:
+        pygame.mixer.pre_init(44100)
+        pygame.init()
+        pygame.display.init()
+        self.screen = pygame.display.set_mode((640, 360), pygame.FULLSCREEN | pygame.SCALED | pygame.NOFRAME, 0, 0, 0)
+        pygame.display.set_caption("Untitled Fishing Game", "Untitled Fishing Game")
+        pygame.mouse.set_visible(False)
+        # the splash only needs the font, everything else is still loading behind it
+        self.screen.fill((0, 0, 0))
+        splash = pygame.font.Font("assets/vt323.ttf", 48).render("Loading...", False, (255, 255, 255))
+        self.screen.blit(splash, splash.get_rect(center=self.screen.get_rect().center))
+        pygame.display.flip()
+        return self.screen
+
+    @staticmethod
+    def open_high_scores(backend: str, path: str):
+        store = make_score_store(backend, path) # (name, weight, difficulty) best first
+        store.ensure_loaded() # while the splash is up, instead of on the first menu frame
+        return store
+
+    def timed_stage(self, name: str, stage, *args, **kwargs):
+        start = perf_counter()
+        result = stage(*args, **kwargs)
+        # runs on the startup workers too, so the report is printed once everything is back on the main thread
+        self.startup_times[name] = perf_counter() - start
+        return result
 
     def main_loop(self) -> None:
         self.running = True
         #pygame.mixer.music.load("assets/bgm_game.wav")
         #pygame.mixer.music.play(loops=1000000)
         while self.running:
-            self.controller.update()
+            self.run_frame(self.frame_time)
+            self.frame_time = self.clock.tick(60)/1000
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                    raise KeyboardInterrupt
-                elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                    self.running = False
-                    raise KeyboardInterrupt
+    def run_frame(self, frame_time: float) -> None:
+        self.profiler.begin_frame()
+        if self.live_input:
+            self.pump_events()
+        if self.recorder:
+            self.recorder.record(frame_time, self.controller, self.keys, self.cast_key_tapped)
+        self.profiler.lap(profiling.EVENTS)
 
-            self.rendering_engine.update(self.scene, self.score, self.fish_clock, self.game_clock, self.game_end_reason, self.high_scores, self.current_frame, self.difficulty, self.controller.nintendo_mode, self.names_list, self.chosen_name_idx) # i'm sorry
-            self.lighting.update()
+        for _ in range(self.timestep.advance(frame_time)):
+            self.step()
+        self.last_snapshot = self.snapshot()
 
-            match self.rendering_engine._last_scene if self.rendering_engine.scene_transfer_stage == 1 else self.scene:
-                case 0:
-                    self.update_game()
-                case 1:
-                    self.update_end_screen()
-                case 2:
-                    self.update_menu()
-                case 3:
-                    self.update_tutorial_screen()
-                case 4:
-                    self.update_difficulty_selector()
-                case 5:
-                    self.update_minigame_tutorial()
-                case 6:
-                    self.update_name_selector()
-
-            self.delta = self.clock.tick(60)/1000
+        self.rendering_engine.update(self.scene, self.score, self.fish_clock, self.game_clock, self.game_end_reason, self.high_scores, self.current_frame, self.difficulty, self.controller.nintendo_mode, self.roster, self.chosen_name_idx) # i'm sorry
+        self.profiler.latency.presented(self.rendering_engine.last_flip_time)
+        if not self.first_frame_logged:
+            self.first_frame_logged = True
+            print(f"[startup] first frame after {(self.rendering_engine.last_flip_time-self.startup_start)*1000:.0f} ms")
+        self.lighting.update()
+        self.profiler.lap(profiling.LIGHTING)
+        self.profiler.end_frame()
+
+    def pump_events(self) -> None:
+        for event in pygame.event.get():
+            if event.type in (pygame.JOYBUTTONDOWN, pygame.JOYHATMOTION) or (event.type == pygame.KEYDOWN and event.key in LATENCY_KEYS):
+                # a hat returning to the centre isn't something the player waits to see
+                if event.type != pygame.JOYHATMOTION or event.value != (0, 0):
+                    self.profiler.latency.delivered(perf_counter())
+            if event.type == pygame.QUIT:
+                self.running = False
+                raise KeyboardInterrupt
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                self.running = False
+                raise KeyboardInterrupt
+            elif event.type == pygame.KEYDOWN and event.key == PROFILER_OVERLAY_KEY:
+                self.profiler.toggle_overlay()
+            elif event.type == pygame.KEYDOWN and event.key == PROFILER_DUMP_KEY:
+                self.profiler.dump(extra={"text_cache": self.rendering_engine.text_cache.stats(), "prefetch": self.rendering_engine.prefetcher.stats(), "lighting": self.lighting.serial_stats()})
+            else:
+                self.controller.handle_event(event)
+        self.keys = pygame.key.get_pressed()
+        self.cast_key_tapped = self.cast_key_tapped or pygame.key.get_just_pressed()[CAST_BTN_KEY]
+
+    def step(self) -> None:
+        self.controller.update()
+        if self.profiler.latency.pending:
+            self.profiler.latency.consume(self.latency_key())
+        self.profiler.lap(profiling.CONTROLLER)
+
+        match self.rendering_engine._last_scene if self.rendering_engine.scene_transfer_stage == 1 else self.scene:
+            case 0:
+                self.update_game()
+            case 1:
+                self.update_end_screen()
+            case 2:
+                self.update_menu()
+            case 3:
+                self.update_tutorial_screen()
+            case 4:
+                self.update_difficulty_selector()
+            case 5:
+                self.update_minigame_tutorial()
+            case 6:
+                self.update_name_selector()
+        self.profiler.lap(profiling.SCENE_UPDATE)
+
+        self.cast_key_tapped = False
+
+    def simulate(self, seconds: float, render: bool = False) -> int:
+        # runs the simulation as fast as possible, for headless balancing and regression runs
+        # without rendering, scene changes happen instantly instead of after the fade
+        steps = round(seconds / self.timestep.step)
+        for _ in range(steps):
+            self.step()
+            if render:
+                self.rendering_engine.update(self.scene, self.score, self.fish_clock, self.game_clock, self.game_end_reason, self.high_scores, self.current_frame, self.difficulty, self.controller.nintendo_mode, self.roster, self.chosen_name_idx)
+        return steps
+
+    def latency_key(self) -> str:
+        scene = SCENE_NAMES.get(self.scene, str(self.scene))
+        return f"{scene}/{type(self.current_frame).__name__}" if self.current_frame else scene
+
+    def snapshot(self) -> GameSnapshot:
+        return GameSnapshot(self.scene, self.score, self.fish_clock, self.game_clock, self.game_end_reason, self.difficulty, self.chosen_name_idx, self.controller.nintendo_mode)
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        # a minigame in progress isn't restored, the player casts again
+        self.last_snapshot = snapshot # first, so a restore that fails partway still passes it on
+        self.scene = snapshot.scene
+        self.score = snapshot.score
+        self.fish_clock = snapshot.fish_clock
+        self.game_clock = snapshot.game_clock
+        self.game_end_reason = snapshot.game_end_reason
+        self.difficulty = snapshot.difficulty
+        self.chosen_name_idx = snapshot.chosen_name_idx
+        self.controller.nintendo_mode = snapshot.nintendo_mode
+
+    def close(self, keep_resources: bool = False):
+        # keep_resources leaves the display, hardware and loaded files to the next Game on the same registry
+        self.rendering_engine.close()
+        if self.recorder:
+            self.recorder.close()
+        if not keep_resources:
+            self.resources.close()
 
     def attempt_to_change_scene(self, scene: int):
         if self.rendering_engine.scene_transfer_stage == 0:
@@ -103,26 +265,8 @@ class Game:
                 difficulty_name = "Uncommon"
             case 2:
                 difficulty_name = "Rare"
-        highest_score = 0
-        highest_score_idx = -1
-        for idx, score in enumerate(self.high_scores):
-            if score[0] == self.names_list[self.chosen_name_idx]:
-                if score[1] > highest_score:
-                    highest_score = score[1]
-                    highest_score_idx = idx
-                else:
-                    self.high_scores.remove(score)
-        if self.score > highest_score:
-            self.high_scores.append((self.names_list[self.chosen_name_idx], round(self.score, 1), difficulty_name))
-            if highest_score_idx != -1:
-                self.high_scores.pop(highest_score_idx)
-        self.high_scores.sort(reverse=True, key=lambda val: val[1])
-        out = ""
-        for score in self.high_scores:
-            out += f"{score[0]} | {score[1]} | {score[2]}\n"
-        out = out.rstrip("\n")
-        with open("high_scores.txt", "w") as f:
-            f.write(out)
+        if self.score > 0:
+            self.high_scores.submit(self.roster[self.chosen_name_idx], round(self.score, 1), difficulty_name)
 
     def update_game(self):
         # update timers (mario seconds :D)
@@ -136,7 +280,7 @@ class Game:
             self.game_end_reason = "You ran out of time!"
             self.attempt_to_change_scene(6)
 
-        if (self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]) and not self.current_frame and self.rendering_engine.scene_transfer_stage == 0:
+        if (self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped) and not self.current_frame and self.rendering_engine.scene_transfer_stage == 0:
             match self.difficulty:
                 case -1:
                     self.current_frame = minigames.DemoMinigame(self, self.rendering_engine, self.lighting)
@@ -149,7 +293,7 @@ class Game:
             self.lighting.set_mode(FAST_FLASH)
 
         if self.current_frame:
-            result = self.current_frame.update(self.controller, pygame.key.get_pressed(), self.delta)
+            result = self.current_frame.update(self.controller, self.keys, self.delta)
             if isinstance(result, float):
                 if result:
                     self.fish_clock = FISH_CLOCK_FULL
@@ -160,19 +304,21 @@ class Game:
         self.score = round(pygame.math.clamp(self.score, 0, 1000000000), 1)
 
     def update_end_screen(self):
+        self.high_scores.poll()
         self.difficulty = 0
         self.chosen_name_idx = 0
-        if self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]:
+        if self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped:
             self.attempt_to_change_scene(2)
 
     def update_menu(self):
-        if self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]:
+        self.high_scores.poll()
+        if self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped:
             self.attempt_to_change_scene(3)
         if self.controller.get_button(self.controller.select, just_pressed=True):
             self.controller.nintendo_mode = not self.controller.nintendo_mode
 
     def update_tutorial_screen(self):
-        if self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]:
+        if self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped:
             self.attempt_to_change_scene(4)
 
     def update_difficulty_selector(self):
@@ -182,11 +328,11 @@ class Game:
         elif self.controller.get_dpad_as_btn(just_pressed=True)[1]:
             self.difficulty += 1
         self.difficulty = pygame.math.clamp(self.difficulty, 0, 2)
-        if self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]:
+        if self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped:
             self.attempt_to_change_scene(5)
 
     def update_minigame_tutorial(self):
-        if self.controller.get_proceed_button(just_pressed=True) or pygame.key.get_just_pressed()[CAST_BTN_KEY]:
+        if self.controller.get_proceed_button(just_pressed=True) or self.cast_key_tapped:
             self.score = 0
             self.game_clock = 180
             self.fish_clock = FISH_CLOCK_FULL
@@ -196,17 +342,36 @@ class Game:
         if self.controller.get_proceed_button(just_pressed=True):
             self.update_high_scores()
             self.attempt_to_change_scene(1)
-        if self.controller.get_dpad_as_btn(just_pressed=True)[2]:
+        up, down, left, right = self.controller.get_dpad_as_btn(just_pressed=True)
+        if left:
             self.chosen_name_idx -= 1
-        if self.controller.get_dpad_as_btn(just_pressed=True)[3]:
+        if right:
             self.chosen_name_idx += 1
-        self.chosen_name_idx = pygame.math.clamp(self.chosen_name_idx, 0, len(self.names_list)-1)
+        if self.controller.get_button(self.controller.lb, just_pressed=True):
+            self.chosen_name_idx -= ROSTER_PAGE
+        if self.controller.get_button(self.controller.rb, just_pressed=True):
+            self.chosen_name_idx += ROSTER_PAGE
+        self.chosen_name_idx = pygame.math.clamp(self.chosen_name_idx, 0, len(self.roster)-1)
+        if up:
+            self.chosen_name_idx = self.roster.jump_letter(self.chosen_name_idx, -1)
+        if down:
+            self.chosen_name_idx = self.roster.jump_letter(self.chosen_name_idx, 1)
 
 if __name__ == "__main__":
+    resources = ResourceRegistry()
+    snapshot = None
+    crashes: deque[float] = deque()
+    game = None
     while True:
         try:
-            game = Game()
-            game.lighting.set_mode(MENU_MUSIC_FLASH)
+            restart_start = perf_counter()
+            game = None
+            game = Game(high_scores_file=HIGH_SCORES_FILE, input_log_dir=INPUT_LOG_DIR, score_backend=SCORE_BACKEND, resources=resources)
+            if snapshot:
+                game.restore(snapshot)
+                print(f"[main] recovered into {SCENE_NAMES.get(snapshot.scene)} with {snapshot.score} lbs in {(perf_counter()-restart_start)*1000:.0f} ms")
+            else:
+                game.lighting.set_mode(MENU_MUSIC_FLASH)
             #game.lighting.bulk_add_sequenced_callbacks([None, None, None, None, None, ALL_OFF])
             game.main_loop()
         except KeyboardInterrupt:
@@ -214,5 +379,25 @@ if __name__ == "__main__":
             break
         except Exception as e:
             print(f"[main] caught exception {e}, restarting game silently...")
-    game.lighting.set_mode(ALL_OFF)
-    game.lighting.update()
\ No newline at end of file
+            now = monotonic()
+            crashes.append(now)
+            while crashes[0] < now - CRASH_WINDOW:
+                crashes.popleft()
+            # a game that died before taking a snapshot of its own (even in Game() or restore()) hands on the one it got
+            snapshot = ((game and game.last_snapshot) or snapshot) if RESTORE_AFTER_CRASH else None
+            if len(crashes) >= COLD_RESTART_CRASHES:
+                # crashing over and over, so don't trust the snapshot or anything the registry is holding
+                print(f"[main] {len(crashes)} crashes in {CRASH_WINDOW}s, doing a cold restart")
+                crashes.clear()
+                snapshot = None
+                if game:
+                    game.close()
+                resources.close()
+                resources = ResourceRegistry()
+            elif game:
+                game.close(keep_resources=True)
+    if game:
+        game.lighting.set_mode(ALL_OFF)
+        game.lighting.update()
+        game.close()
+    resources.close()
@@ -3,7 +3,6 @@ from controller import Controller
 from pygame import Surface, K_a, K_f, K_k
 from pygame.math import clamp
 from pygame.draw import circle, rect
-from pygame.transform import scale
 from pygame import Rect
 from pygame.font import Font
 from random import randint, choice
@@ -15,8 +14,21 @@ RIGHT_KEY = K_f
 
 DEMO_SPEED = 150
 
+FRAME_SIZE = (510, 230)
+FRAME_RECT = Rect((0, 0), FRAME_SIZE)
+WATER_COLOR = "#0099ff"
+
+def circle_bounds(x: float, y: float, radius: int) -> Rect:
+    # the same rect pygame.draw.circle returns, so collisions work without rendering
+    bounds = Rect(0, 0, radius*2, radius*2)
+    bounds.center = (x, y)
+    return bounds.clip(FRAME_RECT)
+
 class BaseMinigame:
 
+    # prebaked backgrounds, one per minigame class and frame size
+    _static_layers: dict[tuple[type, tuple[int, int]], Surface] = {}
+
     def __init__(self, game, rendering_engine, lighting_mc) -> None:
         self.game = game
         self.rendering_engine = rendering_engine
@@ -27,6 +39,18 @@ class BaseMinigame:
 
     def render(self, surface: Surface) -> Surface:
         return surface
+
+    def draw_static_layer(self, surface: Surface):
+        surface.fill(WATER_COLOR)
+
+    def blit_static_layer(self, surface: Surface):
+        key = (type(self), surface.get_size())
+        layer = BaseMinigame._static_layers.get(key)
+        if layer is None:
+            layer = Surface(surface.get_size(), 0, surface)
+            self.draw_static_layer(layer)
+            BaseMinigame._static_layers[key] = layer
+        surface.blit(layer, (0, 0))
     
 
 class DemoMinigame(BaseMinigame):
@@ -42,9 +66,14 @@ class DemoMinigame(BaseMinigame):
         self.n_fish = randint(1, 4)
 
     def update(self, controller: Controller, keys: list, delta_time: float) -> float | None:
-        if controller.get_dpad_as_btn()[2] or keys[LEFT_KEY]:
+        _, _, dpad_left, dpad_right = controller.get_dpad_as_btn()
+        left_held = dpad_left or keys[LEFT_KEY]
+        right_held = dpad_right or keys[RIGHT_KEY]
+        cast_held = controller.get_button(controller.a) or keys[CAST_KEY]
+
+        if left_held:
             self.player_x -= DEMO_SPEED * delta_time
-        elif controller.get_dpad_as_btn()[3] or keys[RIGHT_KEY]:
+        elif right_held:
             self.player_x += DEMO_SPEED * delta_time
         
         self.player_x = clamp(self.player_x, 0, 510)
@@ -67,18 +96,17 @@ class DemoMinigame(BaseMinigame):
             else:
                 fish[4] = False
 
-        if (controller.get_button(controller.a) or keys[CAST_KEY]) and not self.first_frame and not self.previous_inputs[0]:
+        if cast_held and not self.first_frame and not self.previous_inputs[0]:
             if collision_detected != None:
                 return self.fish[collision_detected][3]
             else:
                 return 0.0
 
         self.first_frame = False
-        self.previous_inputs = [controller.get_button(controller.a) or keys[CAST_KEY], controller.get_dpad_as_btn()[2] or keys[LEFT_KEY], controller.get_dpad_as_btn()[3] or keys[RIGHT_KEY]]
+        self.previous_inputs = [cast_held, left_held, right_held]
 
     def render(self, surface: Surface) -> Surface:
-        #surface.fill("#2962ff")
-        surface.fill("#0099ff")
+        self.blit_static_layer(surface)
 
         colliding_with_fish = False
         for fish in self.fish:
@@ -94,60 +122,70 @@ class DemoMinigame(BaseMinigame):
     
 
 class CommonMinigame(BaseMinigame):
+
+    # tunables, also read by batch_sim.py
+    BAR_RISE_SPEED = 160
+    BAR_FALL_SPEED = 130
+    BAR_RANGE = (6, 144)
+    FISH_SPEED = 125
+    FISH_RANGE = (10, 188)
+    # randint(0, 100) has to beat this for the fish to move up, by the direction it moved last
+    FISH_MOVE_ODDS = {0: 50, 1: 1, -1: 99}
+    COUNTER_START = 5
+    COUNTER_GAIN = 2 # per second on the fish
+    COUNTER_LOSS = 4 # per second off the fish
+    CATCH_AT = 10
+    WEIGHT_RANGE = (100, 250) # tenths of a pound
     
     def __init__(self, game, rendering_engine, lighting_mc) -> None:
         super().__init__(game, rendering_engine, lighting_mc)
         self.fish_y = 0
         self.bar_y = 0
-        self.counter_clock = 5
+        self.counter_clock = self.COUNTER_START
         self.last_fish_move_direction = 0
-        self.fish_img = scale(choice(rendering_engine.fish_textures), (32, 32))
+        # rendering_engine is None when simulating headless (balance.py), nothing gets drawn then
+        self.fish_img = rendering_engine.small_fish_textures[choice(rendering_engine.fish_textures)] if rendering_engine else None
         self.fish_colliding = False
 
     def update(self, controller: Controller, keys: list, delta_time: float) -> float | None:
         if controller.get_button(controller.a):
-            self.bar_y -= 160 * delta_time
+            self.bar_y -= self.BAR_RISE_SPEED * delta_time
         else:
-            self.bar_y += 130 * delta_time
-        self.bar_y = clamp(self.bar_y, 6, 144)
-
-        match self.last_fish_move_direction:
-            case 0:
-                increase_odds = 50
-            case 1:
-                increase_odds = 1
-            case -1:
-                increase_odds = 99
-            case _: # just in case
-                increase_odds = 50
+            self.bar_y += self.BAR_FALL_SPEED * delta_time
+        self.bar_y = clamp(self.bar_y, *self.BAR_RANGE)
+
+        increase_odds = self.FISH_MOVE_ODDS.get(self.last_fish_move_direction, 50)
         if randint(0, 100) > increase_odds:
-            self.fish_y -= 125 * delta_time
+            self.fish_y -= self.FISH_SPEED * delta_time
             self.last_fish_move_direction = 1
         else:
-            self.fish_y += 125 * delta_time
+            self.fish_y += self.FISH_SPEED * delta_time
             self.last_fish_move_direction = -1
         old_fish_y = self.fish_y
-        self.fish_y = clamp(self.fish_y, 10, 188)
+        self.fish_y = clamp(self.fish_y, *self.FISH_RANGE)
         if old_fish_y != self.fish_y:
             self.last_fish_move_direction = 0
 
         if self.fish_y+32 > self.bar_y and self.fish_y < self.bar_y+80:
-            self.counter_clock += delta_time*2
+            self.counter_clock += delta_time*self.COUNTER_GAIN
             self.fish_colliding = True
         else:
-            self.counter_clock -= delta_time*4
+            self.counter_clock -= delta_time*self.COUNTER_LOSS
             self.fish_colliding = False
 
-        if self.counter_clock > 10:
-            return randint(100, 250)/10
+        if self.counter_clock > self.CATCH_AT:
+            return randint(*self.WEIGHT_RANGE)/10
         elif self.counter_clock < 0:
             return 0.0
         else:
             return None
 
-    def render(self, surface: Surface) -> Surface:
-        surface.fill("#0099ff")
+    def draw_static_layer(self, surface: Surface):
+        super().draw_static_layer(surface)
         rect(surface, (255, 255, 0), (239, 5, 42, 220))
+
+    def render(self, surface: Surface) -> Surface:
+        self.blit_static_layer(surface)
         rect(surface, (0, 127, 0) if self.fish_colliding else (0, 255, 0), (240, self.bar_y, 40, 80))
         surface.blit(self.fish_img, (244, self.fish_y))
         rect(surface, (0, 255, 0), (0, 0, 16, (self.counter_clock/10)*230))
@@ -157,6 +195,19 @@ class CommonMinigame(BaseMinigame):
 
 class UncommonMinigame(BaseMinigame):
 
+    # tunables, also read by batch_sim.py
+    CIRCLE_SPEED = 200
+    CIRCLE_RADIUS = 32
+    FISH_RADIUS = 6
+    FISH_SPEED = 70
+    # randint(0, 100) has to beat this for the fish to move right (or up), by the direction it moved last
+    FISH_MOVE_ODDS = {0: 50, 1: 5, -1: 95}
+    COUNTER_START = 4
+    COUNTER_GAIN = 2
+    COUNTER_LOSS = 4
+    CATCH_AT = 8
+    WEIGHT_RANGE = (251, 400)
+
     def __init__(self, game, rendering_engine, lighting_mc) -> None:
         super().__init__(game, rendering_engine, lighting_mc)
 
@@ -169,47 +220,31 @@ class UncommonMinigame(BaseMinigame):
         self.circle_x = 250
         self.circle_y = 120
 
-        self.counter_clock = 4
+        self.counter_clock = self.COUNTER_START
 
         self.circle_rect = Rect(0, 0, 0, 0)
         self.fish_rect = Rect(1, 1, 1, 1) # don't want these two to be colliding so for frame 1 the color is default
+        self.fish_colliding = False
     
     def update(self, controller: Controller, keys: list, delta_time: float) -> float | None:
-        x_move = controller.get_direction(controller.left_stick)[0]
-        y_move = controller.get_direction(controller.left_stick)[1]
-        self.circle_x += x_move * 200 * delta_time
-        self.circle_y += y_move * 200 * delta_time
-
-        match self.last_fish_move_direction_x:
-            case 0:
-                right_odds = 50
-            case 1:
-                right_odds = 5
-            case -1:
-                right_odds = 95
-            case _: # just in case
-                right_odds = 50
+        x_move, y_move = controller.get_direction(controller.left_stick)
+        self.circle_x += x_move * self.CIRCLE_SPEED * delta_time
+        self.circle_y += y_move * self.CIRCLE_SPEED * delta_time
+
+        right_odds = self.FISH_MOVE_ODDS.get(self.last_fish_move_direction_x, 50)
         if randint(0, 100) > right_odds:
-            self.fish_x += 70 * delta_time
+            self.fish_x += self.FISH_SPEED * delta_time
             self.last_fish_move_direction_x = 1
         else:
-            self.fish_x -= 70 * delta_time
+            self.fish_x -= self.FISH_SPEED * delta_time
             self.last_fish_move_direction_x = -1
 
-        match self.last_fish_move_direction_y:
-            case 0:
-                increase_odds = 50
-            case 1:
-                increase_odds = 5
-            case -1:
-                increase_odds = 95
-            case _: # just in case
-                increase_odds = 50
+        increase_odds = self.FISH_MOVE_ODDS.get(self.last_fish_move_direction_y, 50)
         if randint(0, 100) > increase_odds:
-            self.fish_y -= 70 * delta_time
+            self.fish_y -= self.FISH_SPEED * delta_time
             self.last_fish_move_direction_y = 1
         else:
-            self.fish_y += 70 * delta_time
+            self.fish_y += self.FISH_SPEED * delta_time
             self.last_fish_move_direction_y = -1
 
         prev_x = self.circle_x
@@ -226,26 +261,28 @@ class UncommonMinigame(BaseMinigame):
         self.fish_x = clamp(self.fish_x, 16, 510)
         self.fish_y = clamp(self.fish_y, 0, 230)
 
+        self.circle_rect = circle_bounds(self.circle_x, self.circle_y, self.CIRCLE_RADIUS)
+        self.fish_rect = circle_bounds(self.fish_x, self.fish_y, self.FISH_RADIUS)
         self.fish_colliding = self.circle_rect.colliderect(self.fish_rect)
 
         if self.fish_colliding:
-            self.counter_clock += delta_time*2
+            self.counter_clock += delta_time*self.COUNTER_GAIN
             self.fish_colliding = True
         else:
-            self.counter_clock -= delta_time*4
+            self.counter_clock -= delta_time*self.COUNTER_LOSS
             self.fish_colliding = False
 
-        if self.counter_clock > 8:
-            return randint(251, 400)/10
+        if self.counter_clock > self.CATCH_AT:
+            return randint(*self.WEIGHT_RANGE)/10
         elif self.counter_clock < 0:
             return 0.0
         else:
             return None
     
     def render(self, surface: Surface) -> Surface:
-        surface.fill("#0099ff")
-        self.circle_rect = circle(surface, "#0000ff" if self.fish_colliding else "#000055", (self.circle_x, self.circle_y), 32)
-        self.fish_rect = circle(surface, "#000011", (self.fish_x, self.fish_y), 6)
+        self.blit_static_layer(surface)
+        circle(surface, "#0000ff" if self.fish_colliding else "#000055", (self.circle_x, self.circle_y), self.CIRCLE_RADIUS)
+        circle(surface, "#000011", (self.fish_x, self.fish_y), self.FISH_RADIUS)
         rect(surface, (0, 255, 0), (0, 0, 16, (self.counter_clock/8)*230))
         rect(surface, (255, 0, 0), (0, (self.counter_clock/8)*230, 16, 231-(self.counter_clock/10)*230))
         return surface
@@ -253,6 +290,17 @@ class UncommonMinigame(BaseMinigame):
 
 class RareMinigame(BaseMinigame):
 
+    # tunables, also read by batch_sim.py
+    CIRCLE_SPEED = 200
+    CIRCLE_RADIUS = 32
+    FISH_RADIUS = 6
+    FISH_SPEED = 50
+    FISH_MOVE_ODDS = {0: 50, 1: 1, -1: 99}
+    SEQUENCE_LENGTH = 4
+    ESCAPE_TIME = 3 # seconds off the fish before the sequence slips back a button
+    WEIGHT_RANGE = (401, 700)
+    PENALTY_RANGE = (-700, -401) # fifteenths of a pound, lost when the sequence falls apart
+
     def __init__(self, game, rendering_engine, lighting_mc) -> None:
         super().__init__(game, rendering_engine, lighting_mc)
 
@@ -267,51 +315,35 @@ class RareMinigame(BaseMinigame):
 
         self.circle_rect = Rect(0, 0, 0, 0)
         self.fish_rect = Rect(1, 1, 1, 1) # don't want these two to be colliding so for frame 1 the color is default
+        self.fish_colliding = False
     
-        self.sequence = "".join([choice(["A", "B", "X", "Y"]) for _ in range(4)])
+        self.sequence = "".join([choice(["A", "B", "X", "Y"]) for _ in range(self.SEQUENCE_LENGTH)])
         self.counter = 0
         self.time_clock = 0
 
-        self.font: Font = self.rendering_engine.font
+        self.font: Font | None = self.rendering_engine.font if rendering_engine else None
 
         self.first_frame = True
 
     def update(self, controller: Controller, keys: list, delta_time: float) -> float | None:
-        x_move = controller.get_direction(controller.left_stick)[0]
-        y_move = controller.get_direction(controller.left_stick)[1]
-        self.circle_x += x_move * 200 * delta_time
-        self.circle_y += y_move * 200 * delta_time
-
-        match self.last_fish_move_direction_x:
-            case 0:
-                right_odds = 50
-            case 1:
-                right_odds = 1
-            case -1:
-                right_odds = 99
-            case _: # just in case
-                right_odds = 50
+        x_move, y_move = controller.get_direction(controller.left_stick)
+        self.circle_x += x_move * self.CIRCLE_SPEED * delta_time
+        self.circle_y += y_move * self.CIRCLE_SPEED * delta_time
+
+        right_odds = self.FISH_MOVE_ODDS.get(self.last_fish_move_direction_x, 50)
         if randint(0, 100) > right_odds:
-            self.fish_x += 50 * delta_time
+            self.fish_x += self.FISH_SPEED * delta_time
             self.last_fish_move_direction_x = 1
         else:
-            self.fish_x -= 50 * delta_time
+            self.fish_x -= self.FISH_SPEED * delta_time
             self.last_fish_move_direction_x = -1
 
-        match self.last_fish_move_direction_y:
-            case 0:
-                increase_odds = 50
-            case 1:
-                increase_odds = 1
-            case -1:
-                increase_odds = 99
-            case _: # just in case
-                increase_odds = 50
+        increase_odds = self.FISH_MOVE_ODDS.get(self.last_fish_move_direction_y, 50)
         if randint(0, 100) > increase_odds:
-            self.fish_y -= 50 * delta_time
+            self.fish_y -= self.FISH_SPEED * delta_time
             self.last_fish_move_direction_y = 1
         else:
-            self.fish_y += 50 * delta_time
+            self.fish_y += self.FISH_SPEED * delta_time
             self.last_fish_move_direction_y = -1
 
         prev_x = self.circle_x
@@ -328,6 +360,8 @@ class RareMinigame(BaseMinigame):
         self.fish_x = clamp(self.fish_x, 16, 510)
         self.fish_y = clamp(self.fish_y, 0, 230)
 
+        self.circle_rect = circle_bounds(self.circle_x, self.circle_y, self.CIRCLE_RADIUS)
+        self.fish_rect = circle_bounds(self.fish_x, self.fish_y, self.FISH_RADIUS)
         self.fish_colliding = self.circle_rect.colliderect(self.fish_rect)
 
         # wait when did i write this gem lmfao
@@ -342,7 +376,7 @@ class RareMinigame(BaseMinigame):
         if not self.fish_colliding:
             self.time_clock += delta_time
         
-        if self.time_clock > 3:
+        if self.time_clock > self.ESCAPE_TIME:
             self.counter -= 1
             self.time_clock = 0
 
@@ -372,19 +406,19 @@ class RareMinigame(BaseMinigame):
 
         self.first_frame = False
 
-        if self.counter > 3:
-            return randint(401, 700)/10
+        if self.counter >= self.SEQUENCE_LENGTH:
+            return randint(*self.WEIGHT_RANGE)/10
         elif self.counter < 0:
-            return randint(-700, -401)/15
+            return randint(*self.PENALTY_RANGE)/15
         else:
             return None
     
     def render(self, surface: Surface) -> Surface:
-        surface.fill("#0099ff")
-        self.circle_rect = circle(surface, "#0000ff" if self.fish_colliding else "#000055", (self.circle_x, self.circle_y), 32)
-        self.fish_rect = circle(surface, "#000011", (self.fish_x, self.fish_y), 6)
+        self.blit_static_layer(surface)
+        circle(surface, "#0000ff" if self.fish_colliding else "#000055", (self.circle_x, self.circle_y), self.CIRCLE_RADIUS)
+        circle(surface, "#000011", (self.fish_x, self.fish_y), self.FISH_RADIUS)
         #rect(surface, (0, 255, 0), (0, 0, 16, (self.counter_clock/8)*230))
         #rect(surface, (255, 0, 0), (0, (self.counter_clock/8)*230, 16, 231-(self.counter_clock/10)*230))
         for idx, char in enumerate(self.sequence):
-            surface.blit(self.font.render(char, False, (0, 255, 0) if self.counter>idx else (255, 0, 0)), (416+idx*24, 180))
+            surface.blit(self.rendering_engine.text_cache.render(self.font, char, False, (0, 255, 0) if self.counter>idx else (255, 0, 0)), (416+idx*24, 180))
         return surface
\ No newline at end of file
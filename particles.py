@@ -0,0 +1,101 @@
+import numpy as np
+import pygame
+
+INITIAL_CAPACITY = 256
+
+class ParticlePool:
+    # every particle lives in a row of these columns, so moving and expiring them is a handful of numpy ops
+    # instead of a python loop over objects
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+        self.count = 0
+        self.x = np.zeros(capacity, np.float64)
+        self.y = np.zeros(capacity, np.float64)
+        self.vx = np.zeros(capacity, np.float64)
+        self.vy = np.zeros(capacity, np.float64)
+        self.ttl = np.zeros(capacity, np.int32)
+        self.texture_id = np.zeros(capacity, np.int32)
+
+        self.textures: list[pygame.Surface] = []
+        self._texture_ids: dict[pygame.Surface, int] = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.x)
+
+    def _columns(self) -> tuple[np.ndarray, ...]:
+        return self.x, self.y, self.vx, self.vy, self.ttl, self.texture_id
+
+    def _reserve(self, extra: int):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity*2)
+        self.x, self.y, self.vx, self.vy, self.ttl, self.texture_id = (np.resize(column, capacity) for column in self._columns())
+
+    def get_texture_id(self, texture: pygame.Surface) -> int:
+        texture_id = self._texture_ids.get(texture)
+        if texture_id is None:
+            texture_id = len(self.textures)
+            self.textures.append(texture)
+            self._texture_ids[texture] = texture_id
+        return texture_id
+
+    def emit(self, x: float, y: float, vx: float, vy: float, texture: pygame.Surface, ttl: int = 120):
+        self._reserve(1)
+        i = self.count
+        self.x[i], self.y[i], self.vx[i], self.vy[i] = x, y, vx, vy
+        self.ttl[i] = ttl
+        self.texture_id[i] = self.get_texture_id(texture)
+        self.count += 1
+
+    def emit_many(self, x, y, vx, vy, texture: pygame.Surface, ttl=120):
+        # for bursts (splashes, bubbles, confetti): every argument but texture can be a scalar or an array
+        n = max(np.size(x), np.size(y), np.size(vx), np.size(vy), np.size(ttl))
+        self._reserve(n)
+        new = slice(self.count, self.count+n)
+        self.x[new], self.y[new], self.vx[new], self.vy[new] = x, y, vx, vy
+        self.ttl[new] = ttl
+        self.texture_id[new] = self.get_texture_id(texture)
+        self.count += n
+
+    def update(self):
+        n = self.count
+        live = slice(0, n)
+        self.x[live] += self.vx[live]
+        self.y[live] += self.vy[live]
+        self.ttl[live] -= 1
+
+        alive = self.ttl[live] > 0
+        if alive.all():
+            return
+        # swap-remove: fill the holes left by expired particles with live ones from the end
+        dead = np.flatnonzero(~alive)
+        new_count = n - len(dead)
+        holes = dead[dead < new_count]
+        movers = np.flatnonzero(alive[new_count:]) + new_count
+        for column in self._columns():
+            column[holes] = column[movers]
+        self.count = new_count
+
+    def blit_sequence(self) -> list[tuple[pygame.Surface, tuple[float, float]]]:
+        n = self.count
+        textures = self.textures
+        return [(textures[texture_id], (x, y)) for texture_id, x, y in zip(self.texture_id[:n].tolist(), self.x[:n].tolist(), self.y[:n].tolist())]
+
+    def draw(self, surface: pygame.Surface):
+        surface.fblits(self.blit_sequence())
+
+    def bounds(self) -> pygame.Rect | None:
+        if not self.count:
+            return None
+        n = self.count
+        sizes = np.array([texture.get_size() for texture in self.textures], np.int32)[self.texture_id[:n]]
+        left = int(np.floor(self.x[:n].min()))
+        top = int(np.floor(self.y[:n].min()))
+        right = int(np.ceil((self.x[:n] + sizes[:, 0]).max()))
+        bottom = int(np.ceil((self.y[:n] + sizes[:, 1]).max()))
+        return pygame.Rect(left, top, right-left, bottom-top)
+
+    def clear(self):
+        self.count = 0
@@ -0,0 +1,79 @@
+# loads the next scene's music off the render thread while the screen fades out,
+# so the swap at full black doesn't stall on disk i/o
+
+import io
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+
+SCENE_MUSIC = {
+    0: "assets/bgm_game.wav",
+    2: "assets/bgm_menu.wav",
+    6: "assets/bgm_end.wav",
+}
+
+@dataclass
+class PrefetchTiming:
+    path: str
+    load_time: float # seconds the worker spent reading the file
+    ready: bool # whether it finished before the scene swap needed it
+    wait_time: float # seconds the swap blocked waiting for it
+
+class AssetPrefetcher:
+
+    def __init__(self, history: int = 64) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.pending: dict[str, Future] = {}
+        self.timings: deque[PrefetchTiming] = deque(maxlen=history)
+        self.misses = 0 # swaps that had nothing prefetched and loaded synchronously
+
+    def prefetch(self, path: str):
+        if path not in self.pending:
+            self.pending[path] = self.executor.submit(self._read, path)
+
+    def prefetch_scene(self, scene: int):
+        music = SCENE_MUSIC.get(scene)
+        if music:
+            self.prefetch(music)
+
+    @staticmethod
+    def _read(path: str) -> tuple[bytes, float]:
+        start = perf_counter()
+        with open(path, "rb") as f:
+            data = f.read()
+        return data, perf_counter()-start
+
+    def take(self, path: str) -> io.BytesIO | None:
+        # returns the prefetched file, or None if it wasn't prefetched (or couldn't be read)
+        future = self.pending.pop(path, None)
+        if future is None:
+            self.misses += 1
+            return None
+        ready = future.done()
+        start = perf_counter()
+        try:
+            data, load_time = future.result()
+        except OSError:
+            return None
+        self.timings.append(PrefetchTiming(os.path.basename(path), load_time, ready, perf_counter()-start))
+        return io.BytesIO(data)
+
+    def close(self):
+        # doesn't wait on a read in flight, the game that asked for it is going away
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "prefetched": len(self.timings),
+            "ready_in_time": sum(timing.ready for timing in self.timings),
+            "misses": self.misses,
+            "max_load_ms": round(max((timing.load_time for timing in self.timings), default=0)*1000, 2),
+            "max_wait_ms": round(max((timing.wait_time for timing in self.timings), default=0)*1000, 2),
+            "recent": [vars(timing) for timing in list(self.timings)[-5:]],
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
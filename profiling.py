@@ -0,0 +1,158 @@
+# per-phase frame timing
+# each phase boundary calls lap(), which charges the time since the previous lap to that phase.
+# a frame's timings go into a fixed size ring buffer that the overlay summarises and dump() exports
+
+import csv
+import json
+import os
+from array import array
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+RING_SIZE = 600 # frames, 10 seconds at 60 fps
+OVERLAY_REFRESH_FRAMES = 15 # the overlay text changes 4 times a second instead of every frame
+
+CONTROLLER = 0
+EVENTS = 1
+SCENE_UPDATE = 2
+RENDER_SCENE = 3 # fades, scene setup and per-scene hud logic
+PARTICLES = 4
+TEXT = 5
+BACKGROUND = 6 # restoring the background and compositing the overlay onto it
+MINIGAME_RENDER = 7
+FLIP = 8
+LIGHTING = 9
+PHASE_NAMES = ["controller", "events", "scene_update", "render_scene", "particles", "text", "background", "minigame_render", "flip", "lighting"]
+
+LATENCY_HISTORY = 512 # latency samples kept per scene/minigame
+
+class InputLatencyTracker:
+    # input events are stamped when pygame hands them over, picked up by the simulation step that reads them,
+    # and measured once the frame drawn after that step has been flipped
+
+    def __init__(self, history: int = LATENCY_HISTORY) -> None:
+        self.history = history
+        self.pending: list[float] = [] # delivered, not seen by a step yet
+        self.consumed: list[tuple[float, str]] = [] # seen by a step, waiting for the flip
+        self.samples: dict[str, deque[float]] = {}
+        self.count = 0
+
+    def delivered(self, timestamp: float):
+        self.pending.append(timestamp)
+
+    def consume(self, key: str):
+        self.consumed.extend((timestamp, key) for timestamp in self.pending)
+        self.pending.clear()
+
+    def presented(self, flip_time: float):
+        for timestamp, key in self.consumed:
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = deque(maxlen=self.history)
+            samples.append(flip_time - timestamp)
+            self.count += 1
+        self.consumed.clear()
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        out = {}
+        for key, samples in sorted(self.samples.items()):
+            data = np.array(samples) * 1000
+            out[key] = {
+                "samples": len(data),
+                "p50_ms": round(float(np.percentile(data, 50)), 3),
+                "p95_ms": round(float(np.percentile(data, 95)), 3),
+                "max_ms": round(float(data.max()), 3),
+            }
+        return out
+
+class FrameProfiler:
+
+    def __init__(self, size: int = RING_SIZE) -> None:
+        self.size = size
+        self.columns = len(PHASE_NAMES) + 1 # last column is the whole frame
+        self.ring = array("d", bytes(8 * size * self.columns))
+        self.frames = 0
+
+        self._row = [0.0] * self.columns
+        self._frame_start = 0.0
+        self._last = 0.0
+
+        self.overlay_visible = False
+        self.overlay_lines: list[str] = []
+
+        self.latency = InputLatencyTracker()
+
+    def begin_frame(self):
+        self._row = [0.0] * self.columns
+        self._frame_start = self._last = perf_counter()
+
+    def lap(self, phase: int) -> float:
+        now = perf_counter()
+        self._row[phase] += now - self._last
+        self._last = now
+        return now
+
+    def skip(self):
+        # drop the time since the last lap, e.g. for work that belongs to no phase
+        self._last = perf_counter()
+
+    def end_frame(self):
+        self._row[-1] = perf_counter() - self._frame_start
+        base = (self.frames % self.size) * self.columns
+        self.ring[base:base+self.columns] = array("d", self._row)
+        self.frames += 1
+        if self.overlay_visible and self.frames % OVERLAY_REFRESH_FRAMES == 0:
+            self.overlay_lines = self.format_summary()
+
+    def samples(self) -> np.ndarray:
+        # frames x columns in seconds, oldest first
+        data = np.frombuffer(self.ring, np.float64).reshape(self.size, self.columns)
+        if self.frames < self.size:
+            return data[:self.frames].copy()
+        split = self.frames % self.size
+        return np.concatenate((data[split:], data[:split]))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        data = self.samples() * 1000
+        out = {}
+        if not len(data):
+            return out
+        for idx, name in enumerate(PHASE_NAMES + ["frame"]):
+            column = data[:, idx]
+            out[name] = {
+                "mean_ms": round(float(column.mean()), 4),
+                "p95_ms": round(float(np.percentile(column, 95)), 4),
+                "max_ms": round(float(column.max()), 4),
+            }
+        return out
+
+    def format_summary(self) -> list[str]:
+        lines = [f"{'phase':16}{'avg':>7}{'p95':>7}{'max':>7}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:16}{stats['mean_ms']:7.2f}{stats['p95_ms']:7.2f}{stats['max_ms']:7.2f}")
+        latency = self.latency.summary()
+        if latency:
+            lines.append(f"{'input latency':16}{'p50':>7}{'p95':>7}{'max':>7}")
+            for key, stats in latency.items():
+                lines.append(f"{key.replace("Minigame", "")[:16]:16}{stats['p50_ms']:7.1f}{stats['p95_ms']:7.1f}{stats['max_ms']:7.1f}")
+        return lines
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_lines = self.format_summary() if self.overlay_visible else []
+
+    def dump(self, directory: str = "profiles", extra: dict | None = None) -> str:
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, datetime.now().strftime("frames_%Y%m%d_%H%M%S"))
+        with open(stem + ".csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name + "_ms" for name in PHASE_NAMES] + ["frame_ms"])
+            for row in self.samples():
+                writer.writerow([f"{value*1000:.4f}" for value in row])
+        with open(stem + ".json", "w") as f:
+            json.dump({"frames": min(self.frames, self.size), "phases": self.summary(), "input_latency": self.latency.summary(), **(extra or {})}, f, indent=2)
+        print(f"[profiling] dumped frame timings to {stem}.csv/.json")
+        return stem
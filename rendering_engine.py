@@ -2,22 +2,25 @@
 import pygame
 from math import sin
 from dataclasses import dataclass, field
-import os
-from random import choice, randint
+from random import Random
 import datetime
-from minigames import BaseMinigame
+from collections import OrderedDict
+from minigames import BaseMinigame, FRAME_SIZE
+from asset_cache import TextureAtlas
+from particles import ParticlePool
+from prefetch import AssetPrefetcher
+from profiling import FrameProfiler
+import profiling
 from lighting_mc import *
+from score_store import Leaderboard
+from roster import Roster
 
 BG_COLOR = pygame.Color("#2962ff")
+FLASH_COLOR = pygame.Color(255, 0, 0)
 
-@dataclass
-class PersistentTexture:
-    x: float
-    y: float
-    vx: float
-    vy: float
-    texture: pygame.Surface
-    ttl: int = 120
+TEXT_CACHE_BUDGET = 4 * 1024 * 1024 # bytes of rendered text surfaces kept around
+PROFILER_OVERLAY_BG = pygame.Color(0, 0, 0)
+PARTICLE_DRAW_LIMIT = 64 # up to this many particles are tracked like any other blit, past it they're drawn as one batch
 
 @dataclass
 class FancyText:
@@ -36,39 +39,113 @@ class FancyText:
     align: int = 0
     small_font: bool = False
 
+class TextCache:
+    # LRU cache of rendered text, so static text doesn't go through freetype every frame
+
+    def __init__(self, budget: int = TEXT_CACHE_BUDGET) -> None:
+        self.budget = budget
+        self.used = 0
+        self.entries: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font: pygame.font.Font, text: str, antialias: bool, color, bg_color=None) -> pygame.Surface:
+        key = (text, font, antialias, tuple(color), None if bg_color is None else tuple(bg_color))
+        drawn = self.entries.get(key)
+        if drawn is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return drawn
+
+        self.misses += 1
+        drawn = font.render(text, antialias, color, bg_color)
+        size = drawn.get_width() * drawn.get_height() * drawn.get_bytesize()
+        if size > self.budget:
+            return drawn
+        self.entries[key] = drawn
+        self.used += size
+        while self.used > self.budget:
+            _, evicted = self.entries.popitem(last=False)
+            self.used -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+            self.evictions += 1
+        return drawn
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries), "bytes": self.used, "budget": self.budget}
+
+class RenderAssets:
+    # the fonts and decoded textures, loaded once per process and shared by every RenderingEngine built on them
+
+    def __init__(self) -> None:
+        self.font = pygame.font.Font("assets/vt323.ttf", 48)
+        self.small_font = pygame.font.Font("assets/vt323.ttf", 24)
+        self.background = pygame.image.load("assets/background.png").convert()
+        self.atlas = TextureAtlas.load()
+
 class RenderingEngine:
 
-    def __init__(self, screen: pygame.Surface, lighting: LightingMC) -> None:
+    def __init__(self, screen: pygame.Surface, lighting: LightingMC, text_cache_budget: int = TEXT_CACHE_BUDGET, dirty_rects: bool = False, profiler: FrameProfiler | None = None, assets: RenderAssets | None = None) -> None:
         self.screen: pygame.Surface = screen
+        self.profiler = profiler or FrameProfiler()
         self.surface: pygame.Surface = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
 
+        # dirty rect mode only redraws and presents the parts of the screen that changed since the last frame
+        self.dirty_rects = dirty_rects
+        self._draws: list[tuple[pygame.Surface, pygame.Rect]] = []
+        self._prev_draws: list[tuple[pygame.Surface, pygame.Rect]] = []
+        self._debug_draws: list[tuple[pygame.Surface, pygame.Rect]] = []
+        self._prev_debug_rects: list[pygame.Rect] = []
+        self._prev_draw_keys: set[tuple[int, tuple[int, int, int, int]]] = set()
+        self._prev_frame_rect: pygame.Rect | None = None
+        self._particle_batch: tuple[int, list[tuple[pygame.Surface, tuple[float, float]]], pygame.Rect] | None = None
+        self._prev_particle_bounds: pygame.Rect | None = None
+        self._full_redraw = True
+        self.last_flip_time = 0.0 # perf_counter() right after the last frame was handed to the display
+
         self.lighting = lighting
+        # cosmetic randomness gets its own generator, so rendering never shifts the sequence the simulation sees
+        self.rng = Random()
     
-        self.persistent_textures: list[PersistentTexture] = []
+        self.particles = ParticlePool()
         self.fancy_texts: list[FancyText] = []
+        self._leaderboard_version = -1 # the leaderboard version the menu texts were last filled from
 
-        self.font = pygame.font.Font("assets/vt323.ttf", 48)
-        self.small_font = pygame.font.Font("assets/vt323.ttf", 24)
+        self.assets = assets or RenderAssets()
+        self.font = self.assets.font
+        self.small_font = self.assets.small_font
+        self.text_cache = TextCache(text_cache_budget)
 
-        self.background = pygame.image.load("assets/background.png").convert()
+        self.background = self.assets.background
 
-        self.weight_texture = pygame.image.load("assets/weight.png").convert_alpha()
-        self.clock_texture = pygame.image.load("assets/clock.png").convert_alpha()
-        self.cloud_texture = pygame.image.load("assets/cloud.png").convert_alpha()
+        self.atlas = self.assets.atlas
+        self.weight_texture = self.atlas.get("assets/weight.png")
+        self.clock_texture = self.atlas.get("assets/clock.png")
+        self.cloud_texture = self.atlas.get("assets/cloud.png")
 
-        self.normal_fish_textures = [pygame.transform.scale(pygame.image.load("assets/fish/"+file).convert_alpha(), (64, 64)) for file in os.listdir("assets/fish") if file == file.removesuffix(".old")]
-        self.rare_fish_textures = [pygame.transform.scale(pygame.image.load("assets/rare_fish/"+file).convert_alpha(), (64, 64)) for file in os.listdir("assets/rare_fish") if file == file.removesuffix(".old")]
+        self.normal_fish_textures = self.atlas.get_directory("assets/fish", (64, 64))
+        self.rare_fish_textures = self.atlas.get_directory("assets/rare_fish", (64, 64))
+        # minigames use a smaller copy of each fish, prescaled in the atlas
+        self.small_fish_textures = dict(zip(self.normal_fish_textures + self.rare_fish_textures, self.atlas.get_directory("assets/fish", (32, 32)) + self.atlas.get_directory("assets/rare_fish", (32, 32))))
         self.fish_textures = self.normal_fish_textures.copy()
         self.fish_textures_include_rare = False
-        self.default_fish_texture = choice(self.fish_textures)
+        self.default_fish_texture = self.rng.choice(self.fish_textures)
 
         self.black_screen = pygame.Surface(self.screen.get_rect().size)
         pygame.draw.rect(self.black_screen, pygame.Color(0, 0, 0), self.screen.get_rect())
         self.black_screen.set_alpha(0)
         self.black_screen_alpha = 0
 
-        self.subsurface_bg = pygame.Surface((520, 240))
-        self.subsurface_bg.fill(pygame.Color(0, 0, 0))
+        # minigames draw straight into a subsurface of the screen, one per frame position, instead of a new surface every frame
+        self.frame_targets: dict[tuple[int, int], pygame.Surface] = {}
+
+        self.prefetcher = AssetPrefetcher()
+        self._music_buffer = None
 
         self.scene_transfer_stage = 0
         self._last_scene = 2
@@ -76,21 +153,36 @@ class RenderingEngine:
         #pygame.mixer.music.load("assets/bgm_end.wav")
         #pygame.mixer.music.play(1000000000)
 
-    def draw_persistent_texture(self, texture: PersistentTexture):
-        self.surface.blit(texture.texture, (texture.x, texture.y))
-        texture.x += texture.vx
-        texture.y += texture.vy
-        texture.ttl -= 1
-        if texture.ttl == 0:
-            self.persistent_textures.remove(texture)
+    def close(self):
+        # the assets belong to whoever passed them in, only the engine's own threads go
+        self.prefetcher.close()
+
+    def blit(self, surface: pygame.Surface, pos) -> pygame.Rect:
+        rect = surface.get_rect(topleft=pos)
+        self._draws.append((surface, rect))
+        return rect
+
+    def draw_particles(self):
+        if self.particles.count <= PARTICLE_DRAW_LIMIT:
+            for texture, pos in self.particles.blit_sequence():
+                self.blit(texture, pos)
+        else:
+            self._particle_batch = (len(self._draws), self.particles.blit_sequence(), self.particles.bounds())
+        self.particles.update()
+
+    def draw_profiler_overlay(self):
+        # drawn over everything, minigame included, so it isn't part of the regular overlay
+        for idx, line in enumerate(self.profiler.overlay_lines):
+            drawn = self.text_cache.render(self.small_font, line, False, (255, 255, 255), PROFILER_OVERLAY_BG)
+            self._debug_draws.append((drawn, drawn.get_rect(topleft=(4, 4+idx*18))))
 
     def draw_fancy_text(self, text: FancyText):
         draw_text = text._curr_text if text.frames_per_character else text.text
-        draw_color = pygame.Color(255, 0, 0) if text._flashing_red > text.flashing_red_interval and text.flashing_red_interval > 0 else text.color
+        draw_color = FLASH_COLOR if text._flashing_red > text.flashing_red_interval and text.flashing_red_interval > 0 else text.color
         if text.small_font:
-            drawn = self.small_font.render(draw_text, False, draw_color, text.bg_color)
+            drawn = self.text_cache.render(self.small_font, draw_text, False, draw_color, text.bg_color)
         else:
-            drawn = self.font.render(draw_text, True, draw_color, text.bg_color)
+            drawn = self.text_cache.render(self.font, draw_text, True, draw_color, text.bg_color)
         drawn_rect = drawn.get_rect()
         match text.align:
             case 0:
@@ -99,7 +191,7 @@ class RenderingEngine:
                 drawn_rect.centerx, drawn_rect.y = text.x, text.y
             case 2:
                 drawn_rect.topright = (text.x, text.y)
-        self.surface.blit(drawn, (drawn_rect.x, drawn_rect.y))
+        self.blit(drawn, (drawn_rect.x, drawn_rect.y))
         text._frame_incrementer += 1
         text._flashing_red += 1
         if text._flashing_red > text.flashing_red_interval*2:
@@ -111,18 +203,19 @@ class RenderingEngine:
             if text._frame_incrementer % text.frames_per_character == 0:
                 text._curr_text += text.text[len(text._curr_text)]
 
-    def update(self, scene: int, score: float, fish_clock: float, main_clock: float, end_reason: str, high_scores: list, frame: BaseMinigame | None, difficulty: int, nintendo_mode: bool, names_list: list[str], chosen_name_idx: int) -> None:
-        #self.screen.fill(pygame.Color(0, 0, 0, 255))
-        self.screen.blit(self.background, (0, 0))
+    def update(self, scene: int, score: float, fish_clock: float, main_clock: float, end_reason: str, high_scores: Leaderboard, frame: BaseMinigame | None, difficulty: int, nintendo_mode: bool, roster: Roster, chosen_name_idx: int) -> None:
+        self._draws = []
+        self._debug_draws = []
+        self._particle_batch = None
 
         if difficulty == 2 and not self.fish_textures_include_rare:
             self.fish_textures.extend(self.rare_fish_textures)
             self.fish_textures_include_rare = True
-            self.default_fish_texture = choice(self.fish_textures)
+            self.default_fish_texture = self.rng.choice(self.fish_textures)
         elif difficulty != 2 and self.fish_textures_include_rare:
             self.fish_textures = self.normal_fish_textures.copy()
             self.fish_textures_include_rare = False
-            self.default_fish_texture = choice(self.fish_textures)
+            self.default_fish_texture = self.rng.choice(self.fish_textures)
 
         match self.scene_transfer_stage:
             case 0:
@@ -132,37 +225,17 @@ class RenderingEngine:
                 self.black_screen.set_alpha(self.black_screen_alpha)
                 if self.black_screen_alpha == 255:
                     self.scene_transfer_stage = 2
-                    self.persistent_textures = []
-                    self.fancy_texts = []
-                    self._last_scene = scene
-                    match scene:
-                        case 0:
-                            self.prepare_game()
-                            self.lighting.set_mode(FAST_CYCLE)
-                        case 1:
-                            self.prepare_end_menu()
-                        case 2:
-                            self.prepare_main_menu(nintendo_mode)
-                            self.lighting.set_mode(MENU_MUSIC_FLASH)
-                        case 3:
-                            self.prepare_tutorial_screen()
-                        case 4:
-                            self.prepare_difficulty_selector()
-                        case 5:
-                            self.prepare_minigame_tutorial(difficulty)
-                        case 6:
-                            self.prepare_name_selector(names_list)
-                            self.lighting.set_mode(END_MUSIC_FLASH)
+                    self.prepare_scene(scene, difficulty, nintendo_mode, roster)
             case 2:
                 self.black_screen_alpha -= 5
                 self.black_screen.set_alpha(self.black_screen_alpha)
                 if self.black_screen_alpha == 0:
                     self.scene_transfer_stage = 0
 
-        self.surface.fill(pygame.Color(0, 0, 0, 0))
-
         if scene != self._last_scene and self.scene_transfer_stage == 0:
             self.scene_transfer_stage = 1
+            # the fade takes ~50 frames, plenty of time to get the next scene's music off the disk
+            self.prefetcher.prefetch_scene(scene)
 
         active_scene = self._last_scene if self.scene_transfer_stage == 1 else scene
 
@@ -180,17 +253,20 @@ class RenderingEngine:
             case 5:
                 self.render_minigame_tutorial(difficulty)
             case 6:
-                self.render_name_selector(names_list, chosen_name_idx)
+                self.render_name_selector(roster, chosen_name_idx)
             case _:
                 self.draw_fancy_text(FancyText(320, 150, "SCENE NOT FOUND ERROR", align=1))
 
-        for persistent_texture in self.persistent_textures:
-            self.draw_persistent_texture(persistent_texture)
+        self.profiler.lap(profiling.RENDER_SCENE)
+        self.draw_particles()
+        self.profiler.lap(profiling.PARTICLES)
         for fancy_text in self.fancy_texts:
             self.draw_fancy_text(fancy_text)
+        if self.profiler.overlay_visible:
+            self.draw_profiler_overlay()
+        self.profiler.lap(profiling.TEXT)
 
-        self.screen.blit(self.surface, (0, 0))
-
+        frame_rect = None
         if frame:
             match active_scene:
                 case 1:
@@ -199,24 +275,148 @@ class RenderingEngine:
                     y_offset = 20
                 case _:
                     y_offset = 0
-            self.screen.blit(self.subsurface_bg, (60, 60+y_offset))
-            self.screen.blit(frame.render(pygame.Surface((510, 230))), (65, 65+y_offset))
+            frame_rect = pygame.Rect(60, 60+y_offset, FRAME_SIZE[0]+10, FRAME_SIZE[1]+10)
 
+        if not self.dirty_rects or self._full_redraw or self.black_screen_alpha != 0:
+            self.present_full(frame, frame_rect)
+        else:
+            self.present_dirty(frame, frame_rect)
+
+        self._prev_draws = self._draws
+        self._prev_draw_keys = {(id(surface), tuple(rect)) for surface, rect in self._draws}
+        self._prev_frame_rect = frame_rect
+        self._prev_debug_rects = [rect for _, rect in self._debug_draws]
+        self._prev_particle_bounds = self._particle_batch[2] if self._particle_batch else None
+
+    def draw_frame(self, frame: BaseMinigame, frame_rect: pygame.Rect):
+        pygame.draw.rect(self.screen, pygame.Color(0, 0, 0), frame_rect, 5)
+        pos = (frame_rect.x+5, frame_rect.y+5)
+        target = self.frame_targets.get(pos)
+        if target is None:
+            target = self.screen.subsurface(pygame.Rect(pos, FRAME_SIZE))
+            self.frame_targets[pos] = target
+        frame.render(target)
+
+    def composite_overlay(self, clip: pygame.Rect | None = None):
+        split = self._particle_batch[0] if self._particle_batch else len(self._draws)
+        below, above = self._draws[:split], self._draws[split:]
+        if clip:
+            below = [draw for draw in below if draw[1].colliderect(clip)]
+            above = [draw for draw in above if draw[1].colliderect(clip)]
+        self.surface.fblits(below)
+        if self._particle_batch and (clip is None or self._particle_batch[2].colliderect(clip)):
+            self.surface.fblits(self._particle_batch[1])
+        self.surface.fblits(above)
+
+    def present_full(self, frame: BaseMinigame | None, frame_rect: pygame.Rect | None):
+        self.screen.blit(self.background, (0, 0))
+        self.surface.fill(pygame.Color(0, 0, 0, 0))
+        self.composite_overlay()
+        self.screen.blit(self.surface, (0, 0))
+        self.profiler.lap(profiling.BACKGROUND)
+
+        if frame:
+            self.draw_frame(frame, frame_rect)
+        self.profiler.lap(profiling.MINIGAME_RENDER)
+
+        self.screen.fblits(self._debug_draws)
         if self.black_screen_alpha != 0:
             self.screen.blit(self.black_screen, (0, 0))
         pygame.display.flip()
+        self.last_flip_time = self.profiler.lap(profiling.FLIP)
+        # whatever the fade left on screen has to be fully painted over once it's gone
+        self._full_redraw = self.black_screen_alpha != 0
+
+    def present_dirty(self, frame: BaseMinigame | None, frame_rect: pygame.Rect | None):
+        draw_keys = {(id(surface), tuple(rect)) for surface, rect in self._draws}
+        dirty = [rect for surface, rect in self._draws if (id(surface), tuple(rect)) not in self._prev_draw_keys]
+        dirty.extend(rect for surface, rect in self._prev_draws if (id(surface), tuple(rect)) not in draw_keys)
+        # the minigame redraws every frame, so its area is always dirty
+        if frame_rect:
+            dirty.append(frame_rect)
+        if self._prev_frame_rect and self._prev_frame_rect != frame_rect:
+            dirty.append(self._prev_frame_rect)
+        # same for a big particle batch, both where it is now and where it was
+        if self._particle_batch:
+            dirty.append(self._particle_batch[2])
+        if self._prev_particle_bounds:
+            dirty.append(self._prev_particle_bounds)
+        dirty.extend(rect for _, rect in self._debug_draws)
+        dirty.extend(self._prev_debug_rects)
+        if self._particle_batch:
+            # one region around the batch, so it only gets drawn once
+            batch_bounds = self._particle_batch[2]
+            overlapping = [rect for rect in dirty if rect.colliderect(batch_bounds)]
+            dirty = [rect for rect in dirty if not rect.colliderect(batch_bounds)]
+            dirty.append(batch_bounds.unionall(overlapping))
+        dirty = [rect.clip(self.screen.get_rect()) for rect in dirty]
+
+        for rect in dirty:
+            self.screen.blit(self.background, rect, rect)
+            self.surface.set_clip(rect)
+            self.surface.fill(pygame.Color(0, 0, 0, 0))
+            self.composite_overlay(rect)
+            self.screen.blit(self.surface, rect, rect)
+        self.surface.set_clip(None)
+        self.profiler.lap(profiling.BACKGROUND)
+
+        if frame:
+            self.draw_frame(frame, frame_rect)
+        self.profiler.lap(profiling.MINIGAME_RENDER)
+
+        self.screen.fblits(self._debug_draws)
+        if dirty:
+            pygame.display.update(dirty)
+        self.last_flip_time = self.profiler.lap(profiling.FLIP)
+
+    def prepare_scene(self, scene: int, difficulty: int, nintendo_mode: bool, roster: Roster):
+        self.particles.clear()
+        self.fancy_texts = []
+        self._leaderboard_version = -1
+        self._last_scene = scene
+        match scene:
+            case 0:
+                self.prepare_game()
+                self.lighting.set_mode(FAST_CYCLE)
+            case 1:
+                self.prepare_end_menu()
+            case 2:
+                self.prepare_main_menu(nintendo_mode)
+                self.lighting.set_mode(MENU_MUSIC_FLASH)
+            case 3:
+                self.prepare_tutorial_screen()
+            case 4:
+                self.prepare_difficulty_selector()
+            case 5:
+                self.prepare_minigame_tutorial(difficulty)
+            case 6:
+                self.prepare_name_selector(roster)
+                self.lighting.set_mode(END_MUSIC_FLASH)
+
+    def play_music(self, path: str):
+        pygame.mixer.music.stop()
+        pygame.mixer.music.unload()
+        prefetched = self.prefetcher.take(path)
+        try:
+            if prefetched:
+                pygame.mixer.music.load(prefetched, path.rsplit(".", 1)[-1])
+            else:
+                pygame.mixer.music.load(path)
+            # the mixer streams from the buffer, so it has to outlive the load call
+            self._music_buffer = prefetched
+        except (pygame.error, FileNotFoundError):
+            print(f"[rendering_engine] couldn't load music {path}, continuing without it")
+            return
+        pygame.mixer.music.play(1000000)
 
     def prepare_game(self):
         self.fancy_texts.append(FancyText(80, 10, "FISH CLOCK: 15.00"))
         self.fancy_texts.append(FancyText(570, 300, "3:00", align=2))
         self.fancy_texts.append(FancyText(80, 300, "0 lbs"))
-        for i in range(randint(1, 5)):
-            self.persistent_textures.append(PersistentTexture(randint(0, 640), randint(0, 150), randint(-2, 2)/10, 0, self.cloud_texture, 10000))
-        self.default_fish_texture = choice(self.fish_textures)
-        pygame.mixer.music.stop()
-        pygame.mixer.music.unload()
-        pygame.mixer.music.load("assets/bgm_game.wav")
-        pygame.mixer.music.play(1000000)
+        for i in range(self.rng.randint(1, 5)):
+            self.particles.emit(self.rng.randint(0, 640), self.rng.randint(0, 150), self.rng.randint(-2, 2)/10, 0, self.cloud_texture, 10000)
+        self.default_fish_texture = self.rng.choice(self.fish_textures)
+        self.play_music("assets/bgm_game.wav")
     
     def prepare_end_menu(self):
         self.fancy_texts.append(FancyText(320, 10, "Game Over", align=1))
@@ -233,10 +433,7 @@ class RenderingEngine:
         self.fancy_texts.append(FancyText(320, 240, "Current button layout: "+layout, align=1, small_font=True))
         self.fancy_texts.append(FancyText(320, 270, "Press BACK to change.", align=1, small_font=True))
         self.fancy_texts.append(FancyText(320, 290, "Press A to play", align=1))
-        pygame.mixer.music.stop()
-        pygame.mixer.music.unload()
-        pygame.mixer.music.load("assets/bgm_menu.wav")
-        pygame.mixer.music.play(1000000)
+        self.play_music("assets/bgm_menu.wav")
 
     def prepare_tutorial_screen(self):
         self.fancy_texts.append(FancyText(320, 20, "How To Play", align=1))
@@ -289,20 +486,18 @@ class RenderingEngine:
         #pygame.mixer.music.stop()
         #pygame.mixer.music.unload()
     
-    def prepare_name_selector(self, names_list: list[str]):
+    def prepare_name_selector(self, roster: Roster):
         self.fancy_texts.append(FancyText(320, 20, "Select Your Name", align=1))
-        self.fancy_texts.append(FancyText(320, 150, names_list[0], align=1))
+        self.fancy_texts.append(FancyText(320, 150, roster[0], align=1))
         self.fancy_texts.append(FancyText(320, 270, "Use D-Pad left/right", align=1))
+        self.fancy_texts.append(FancyText(320, 235, "Up/down jumps a letter, L/R skips 10 names", align=1, small_font=True))
         self.fancy_texts.append(FancyText(320, 310, "Press A to select", align=1))
-        pygame.mixer.music.stop()
-        pygame.mixer.music.unload()
-        pygame.mixer.music.load("assets/bgm_end.wav")
-        pygame.mixer.music.play(1000000)
+        self.play_music("assets/bgm_end.wav")
 
     def render_game(self, score: float, fish_clock: float, main_clock: float):
         #self.screen.blit(self.background, (0, 0))
 
-        self.surface.blit(self.default_fish_texture, (10, 7))
+        self.blit(self.default_fish_texture, (10, 7))
         #self.surface.blit(self.font.render(f"FISH CLOCK: {str(round(fish_clock, 2))}", False, (255, 255, 255)), (80, 15))
         self.fancy_texts[0].text = f"FISH CLOCK: {str(max(round(fish_clock, 2), 0))}"
         if fish_clock < 5:
@@ -311,7 +506,7 @@ class RenderingEngine:
             self.fancy_texts[0].flashing_red_interval = 0
 
         #self.surface.blit(self.font.render(main_clock_str, False, (255, 255, 255)), (100, 100))
-        self.surface.blit(self.clock_texture, (555, 275))
+        self.blit(self.clock_texture, (555, 275))
         self.fancy_texts[1].text = str(datetime.timedelta(seconds=max(main_clock, 0))).lstrip("00:")[:-7]
         if main_clock < 5:
             self.fancy_texts[1].flashing_red_interval = 10
@@ -322,26 +517,22 @@ class RenderingEngine:
         elif main_clock < 45:
             self.fancy_texts[1].flashing_red_interval = 60
 
-        self.surface.blit(self.weight_texture, (10, 295))
+        self.blit(self.weight_texture, (10, 295))
         self.fancy_texts[2].text = f"{str(score)} lbs"
 
-    def render_end_menu(self, score: float, end_reason: str, high_scores: list):
+    def render_end_menu(self, score: float, end_reason: str, high_scores: Leaderboard):
         #self.screen.blit(self.background, (0, 0))
         self.fancy_texts[1].text = f"{end_reason} | Final Weight: {score} lbs"
-        for i in range(3, 13):
-            idx = i-3
-            try:
-                self.fancy_texts[i].text = f"{idx+1} | {high_scores[idx][0]} | {high_scores[idx][1]} lbs"
-            except IndexError:
-                pass
-
-    def render_main_menu(self, nintendo_mode: bool, high_scores: list):
-        for i in range(1, 4):
-            idx = i-1
-            try:
-                self.fancy_texts[i].text = f"{idx+1} | {high_scores[idx][0]} | {high_scores[idx][1]} lbs"
-            except IndexError:
-                pass
+        if high_scores.version != self._leaderboard_version:
+            self._leaderboard_version = high_scores.version
+            for i, text in enumerate(high_scores.row_texts[:10]):
+                self.fancy_texts[3+i].text = text
+
+    def render_main_menu(self, nintendo_mode: bool, high_scores: Leaderboard):
+        if high_scores.version != self._leaderboard_version:
+            self._leaderboard_version = high_scores.version
+            for i, text in enumerate(high_scores.row_texts[:3]):
+                self.fancy_texts[1+i].text = text
         self.fancy_texts[4].text = f"Current button layout: {"Nintendo (BAYX)" if nintendo_mode else "Xbox (ABXY)"}"
 
     def render_tutorial_screen(self):
@@ -364,5 +555,5 @@ class RenderingEngine:
     def render_minigame_tutorial(self, difficulty: int):
         pass
 
-    def render_name_selector(self, names_list: list[str], chosen_name_idx: int):
-        self.fancy_texts[1].text = names_list[chosen_name_idx]
\ No newline at end of file
+    def render_name_selector(self, roster: Roster, chosen_name_idx: int):
+        self.fancy_texts[1].text = roster[chosen_name_idx]
\ No newline at end of file
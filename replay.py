@@ -0,0 +1,106 @@
+# plays a recorded input log back through the game, headless and as fast as it will go
+# usage:
+#   INPUT_LOG_DIR=recordings python main.py              (record)
+#   python replay.py info recordings/inputs_20260101_120000.bin
+#   python replay.py play recordings/inputs_20260101_120000.bin --cprofile replay.prof
+# high scores are written to a temporary copy, so a replay never touches the real file
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import cProfile
+import json
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+import main
+from controller import VirtualController
+from input_log import InputLog
+from score_store import JOURNAL_SUFFIX
+
+PROGRESS_INTERVAL = 60 * 60 * 10 # frames between progress lines, about ten minutes of play
+
+
+def replay(log: InputLog, names_file: str, high_scores_file: str, frames: int | None = None) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        scores_copy = os.path.join(workdir, "high_scores.txt")
+        for suffix in ("", JOURNAL_SUFFIX):
+            if os.path.exists(high_scores_file + suffix):
+                shutil.copyfile(high_scores_file + suffix, scores_copy + suffix)
+        game = main.Game(hardware=False, names_file=names_file, high_scores_file=scores_copy, controller=VirtualController(), seed=log.seed)
+        game.live_input = False
+
+        played = 0
+        game_time = 0.0
+        start = perf_counter()
+        for record in log:
+            if frames is not None and played >= frames:
+                break
+            frame_time = log.apply(record, game)
+            game.run_frame(frame_time)
+            game_time += frame_time
+            played += 1
+            if played % PROGRESS_INTERVAL == 0:
+                print(f"[replay] {played}/{len(log)} frames", file=sys.stderr)
+        elapsed = perf_counter() - start
+        game.close()
+
+        return {
+            "log": log.path,
+            "seed": log.seed,
+            "frames": played,
+            "simulation_steps": game.timestep.steps,
+            "game_seconds": round(game_time, 3),
+            "wall_seconds": round(elapsed, 3),
+            "speedup": round(game_time/elapsed, 2) if elapsed else None,
+            "final_scene": game.scene,
+            "final_score": round(game.score, 2),
+            "high_scores": game.high_scores[:10],
+            "phases": game.profiler.summary(),
+        }
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded input log")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    info_parser = sub.add_parser("info", help="print a log's header")
+    info_parser.add_argument("log")
+
+    play_parser = sub.add_parser("play", help="replay a log headless")
+    play_parser.add_argument("log")
+    play_parser.add_argument("--names", default="names.txt", help="names file the session was recorded with")
+    play_parser.add_argument("--high-scores", default="high_scores.txt", help="high scores the session started from")
+    play_parser.add_argument("--frames", type=int, help="stop after this many frames")
+    play_parser.add_argument("--cprofile", help="write a cProfile of the replay here")
+    play_parser.add_argument("-o", "--output", help="write the results as json")
+
+    args = parser.parse_args()
+    log = InputLog(args.log)
+
+    if args.command == "info":
+        print(f"[replay] {log.path}: seed {log.seed}, {len(log)} frames")
+        return 0
+
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        results = profiler.runcall(replay, log, args.names, args.high_scores, args.frames)
+        profiler.dump_stats(args.cprofile)
+        print(f"[replay] wrote {args.cprofile}", file=sys.stderr)
+    else:
+        results = replay(log, args.names, args.high_scores, args.frames)
+
+    print(f"[replay] {results['frames']} frames ({results['game_seconds']:.1f}s of play) in {results['wall_seconds']:.2f}s, {results['speedup']}x realtime, ended in scene {results['final_scene']} with {results['final_score']} lbs", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
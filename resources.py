@@ -0,0 +1,47 @@
+# everything expensive that can outlive a Game: the display, the arduino, the controller, decoded assets
+# and the data files. when a game crashes, main.py builds a fresh Game around the same registry, so only
+# the game state is rebuilt and the player doesn't sit through a cold start
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable
+
+@dataclass(frozen=True, slots=True)
+class GameSnapshot:
+    # the state a crashed game can pick back up from, taken between frames so it's always consistent
+    scene: int
+    score: float
+    fish_clock: float
+    game_clock: float
+    game_end_reason: str
+    difficulty: int
+    chosen_name_idx: int
+    nintendo_mode: bool
+
+class ResourceRegistry:
+
+    def __init__(self) -> None:
+        self.resources: dict[str, object] = {}
+        self._lock = Lock() # startup stages fill the registry from several threads
+
+    def get(self, name: str, factory: Callable, *args, **kwargs):
+        # returns the resource, creating it the first time it's asked for
+        with self._lock:
+            if name in self.resources:
+                return self.resources[name]
+        resource = factory(*args, **kwargs)
+        with self._lock:
+            return self.resources.setdefault(name, resource)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.resources
+
+    def close(self) -> None:
+        for name, resource in reversed(self.resources.items()):
+            close = getattr(resource, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    print(f"[resources] couldn't close {name}: {e}")
+        self.resources.clear()
@@ -0,0 +1,125 @@
+# the player names for the name selector, sorted and indexed in a memory mapped file
+# names.txt is compiled into names.txt.roster the first time it's needed (and whenever it's newer), after
+# that a roster opens without reading the names, and any name, or the first name of any letter, is one lookup
+# usage:
+#   python roster.py names.txt          (build it ahead of time)
+#
+# file: header (magic, version, name count), the index of the first name under each letter,
+#       count+1 offsets into the name data, then the names as utf-8
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+MAGIC = b"UFGR"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ROSTER_SUFFIX = ".roster"
+
+OTHER_LETTER = "#" # names that don't start with a-z, sorted before the letters
+LETTERS = OTHER_LETTER + "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+BUCKETS = struct.Struct(f"<{len(LETTERS)}I")
+OFFSET = struct.Struct("<I")
+
+def letter_of(name: str) -> str:
+    initial = name[:1].upper()
+    return initial if initial in LETTERS[1:] else OTHER_LETTER
+
+def sort_key(name: str) -> tuple[int, str, str]:
+    return LETTERS.index(letter_of(name)), name.casefold(), name
+
+def build_roster(names_file: str, roster_file: str | None = None) -> str:
+    roster_file = roster_file or names_file + ROSTER_SUFFIX
+    with open(names_file, "r") as f:
+        names = sorted({line.strip() for line in f if line.strip()}, key=sort_key)
+
+    buckets = [len(names)] * len(LETTERS)
+    for idx in reversed(range(len(names))):
+        buckets[LETTERS.index(letter_of(names[idx]))] = idx
+    # an empty letter starts where the next one does, so every letter's names run up to the next letter's start
+    for bucket in reversed(range(len(LETTERS)-1)):
+        if buckets[bucket] == len(names):
+            buckets[bucket] = buckets[bucket+1]
+
+    data = [name.encode() for name in names]
+    offsets = [0]
+    for encoded in data:
+        offsets.append(offsets[-1] + len(encoded))
+
+    # every cabinet on the machine opens the roster at startup, so each build gets a temp file of its own
+    # and whichever finishes last replaces a complete file with another complete one
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(roster_file) or ".", prefix=os.path.basename(roster_file) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(names)))
+            f.write(BUCKETS.pack(*buckets))
+            f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+            f.write(b"".join(data))
+        os.chmod(temp_file, 0o644) # mkstemp makes it private to this user
+        os.replace(temp_file, roster_file)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    print(f"[roster] indexed {len(names)} names into {roster_file}")
+    return roster_file
+
+class Roster:
+    # reads like a list of names
+
+    def __init__(self, roster_file: str) -> None:
+        self.path = roster_file
+        with open(roster_file, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{roster_file} is not a version {VERSION} roster")
+        self.buckets = BUCKETS.unpack_from(self.map, HEADER.size)
+        self.offsets_start = HEADER.size + BUCKETS.size
+        self.data_start = self.offsets_start + (self.count+1) * OFFSET.size
+
+    @classmethod
+    def open(cls, names_file: str) -> "Roster":
+        # rebuilds the index when names.txt has been edited since
+        roster_file = names_file + ROSTER_SUFFIX
+        if not os.path.exists(roster_file) or os.path.getmtime(roster_file) < os.path.getmtime(names_file):
+            build_roster(names_file, roster_file)
+        return cls(roster_file)
+
+    def close(self) -> None:
+        self.map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx: int) -> str:
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError("roster index out of range")
+        start, end = struct.unpack_from("<2I", self.map, self.offsets_start + idx * OFFSET.size)
+        return self.map[self.data_start+start:self.data_start+end].decode()
+
+    def letter_range(self, bucket: int) -> tuple[int, int]:
+        return self.buckets[bucket], self.buckets[bucket+1] if bucket+1 < len(LETTERS) else self.count
+
+    def jump_letter(self, idx: int, step: int) -> int:
+        # the first name of the next (step 1) or previous (step -1) letter that has any names,
+        # going back from partway through a letter lands on that letter's first name
+        bucket = LETTERS.index(letter_of(self[idx]))
+        if step < 0 and self.buckets[bucket] < idx:
+            return self.buckets[bucket]
+        bucket += step
+        while 0 <= bucket < len(LETTERS):
+            first, end = self.letter_range(bucket)
+            if first < end:
+                return first
+            bucket += step
+        return idx
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python roster.py names.txt")
+        sys.exit(1)
+    build_roster(sys.argv[1])
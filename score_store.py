@@ -0,0 +1,304 @@
+# the leaderboard: every player's best catch, kept sorted as scores come in
+# high_scores.txt stays the snapshot in the old "name | weight | difficulty" format, new scores are
+# appended to a journal next to it, and every COMPACT_EVERY scores the two are folded back into a
+# fresh snapshot with an atomic rename. a crash can at worst lose the half written journal line
+# with several cabinets on one machine, the "sqlite" backend shares one database between them instead
+# usage:
+#   python score_store.py import high_scores.txt high_scores.db
+
+import os
+import sqlite3
+import sys
+from bisect import bisect_left, insort
+from time import monotonic, time
+from typing import Iterator
+
+JOURNAL_SUFFIX = ".journal"
+COMPACT_EVERY = 64 # journal lines before they're folded into the snapshot
+
+DISPLAY_ROWS = 10 # rows the menus show, the end menu has the most
+
+SQLITE_TIMEOUT = 5.0 # seconds a write waits for another cabinet's write to finish
+SQLITE_CACHED_ROWS = 100 # rows of the leaderboard kept in memory for the menus
+SQLITE_POLL_INTERVAL = 0.5 # seconds between checks for other cabinets' scores
+
+def parse_line(line: str) -> tuple[str, float, str] | None:
+    parts = line.rstrip("\n").split(" | ")
+    if len(parts) != 3:
+        return None
+    try:
+        return parts[0], float(parts[1]), parts[2]
+    except ValueError:
+        return None
+
+def format_line(name: str, weight: float, difficulty: str) -> str:
+    return f"{name} | {weight} | {difficulty}"
+
+def format_row(rank: int, name: str, weight: float) -> str:
+    return f"{rank} | {name} | {weight} lbs"
+
+class Leaderboard:
+    # what the menus read: a version that goes up whenever the order changes, and the top rows
+    # already formatted, so the renderer only touches its texts when there's something new
+
+    def __init__(self) -> None:
+        self._version = 0
+        self._row_texts: list[str] = []
+        self._row_texts_version = -1
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def ensure_loaded(self) -> None:
+        pass
+
+    def changed(self) -> None:
+        self._version += 1
+
+    @property
+    def row_texts(self) -> list[str]:
+        version = self.version
+        if self._row_texts_version != version:
+            self._row_texts = [format_row(rank, name, weight) for rank, (name, weight, _) in enumerate(self[:DISPLAY_ROWS], 1)]
+            self._row_texts_version = version
+        return self._row_texts
+
+class ScoreStore(Leaderboard):
+    # reads like the old list of (name, weight, difficulty) tuples, best first
+
+    def __init__(self, path: str, compact_every: int = COMPACT_EVERY) -> None:
+        super().__init__()
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.compact_every = compact_every
+        # sorted (-weight, order, name, difficulty), order keeps ties in the order they were set
+        self._entries: list[tuple[float, int, str, str]] | None = None
+        self.best: dict[str, tuple[float, int, str, str]] = {}
+        self.order = 0
+        self.journal_lines = 0
+        self.journal = None
+
+    @property
+    def entries(self) -> list[tuple[float, int, str, str]]:
+        self.ensure_loaded()
+        return self._entries
+
+    @property
+    def version(self) -> int:
+        self.ensure_loaded()
+        return self._version
+
+    def ensure_loaded(self) -> None:
+        # nothing is read until the leaderboard is first needed
+        if self._entries is None:
+            self.load()
+
+    def load(self) -> None:
+        self._entries = []
+        self.best = {}
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    if score := parse_line(line):
+                        self._set(*score)
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.journal_path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        if lines and not lines[-1].endswith(b"\n"):
+            # cut off by a crash, drop it so the next score starts on a line of its own
+            os.truncate(self.journal_path, sum(len(line) for line in lines[:-1]))
+            lines.pop()
+        for line in lines:
+            if score := parse_line(line.decode()):
+                self._set(*score)
+                self.journal_lines += 1
+
+    def _set(self, name: str, weight: float, difficulty: str) -> bool:
+        # keeps the best score per name, returns whether this one took its place
+        previous = self.best.get(name)
+        if previous is not None:
+            if -previous[0] >= weight:
+                return False
+            del self._entries[bisect_left(self._entries, previous)]
+        entry = (-weight, self.order, name, difficulty)
+        self.order += 1
+        insort(self._entries, entry)
+        self.best[name] = entry
+        self.changed()
+        return True
+
+    def submit(self, name: str, weight: float, difficulty: str) -> bool:
+        self.ensure_loaded()
+        if not self._set(name, weight, difficulty):
+            return False
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a")
+        self.journal.write(format_line(name, weight, difficulty) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.journal_lines += 1
+        if self.journal_lines >= self.compact_every:
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(format_line(*score) for score in self))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        # the snapshot already has everything, and replaying the journal on top of it is harmless,
+        # so a crash before this point only means the next load reads a few lines twice
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        open(self.journal_path, "w").close()
+        self.journal_lines = 0
+
+    def poll(self) -> bool:
+        # only this process writes the journal, so nothing can change behind its back
+        return False
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def best_of(self, name: str) -> float | None:
+        self.ensure_loaded()
+        entry = self.best.get(name)
+        return -entry[0] if entry else None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: int | slice) -> tuple[str, float, str] | list[tuple[str, float, str]]:
+        if isinstance(index, slice):
+            return [(name, -weight, difficulty) for weight, _, name, difficulty in self.entries[index]]
+        weight, _, name, difficulty = self.entries[index]
+        return name, -weight, difficulty
+
+    def __iter__(self) -> Iterator[tuple[str, float, str]]:
+        for weight, _, name, difficulty in self.entries:
+            yield name, -weight, difficulty
+
+class SQLiteScoreStore(Leaderboard):
+    # the same leaderboard in a wal mode sqlite database, so several game processes can write to it at once
+    # and each one picks up the others' scores by polling data_version
+
+    def __init__(self, path: str, cached_rows: int = SQLITE_CACHED_ROWS, poll_interval: float = SQLITE_POLL_INTERVAL) -> None:
+        super().__init__()
+        self.path = path
+        self.cached_rows = cached_rows
+        self.poll_interval = poll_interval
+        self.connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # a power cut can lose the last commit, never the database
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS scores (
+                name TEXT PRIMARY KEY,
+                weight REAL NOT NULL,
+                difficulty TEXT NOT NULL,
+                set_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS scores_by_weight ON scores (weight DESC, set_at);
+            CREATE INDEX IF NOT EXISTS scores_by_difficulty ON scores (difficulty, weight DESC, set_at);
+        """)
+        self.rows: list[tuple[str, float, str]] = []
+        self.data_version = -1
+        self.last_poll = float("-inf")
+        self.refresh()
+
+    def refresh(self) -> None:
+        self.data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        self.rows = self.top(self.cached_rows)
+        self.changed()
+
+    def poll(self) -> bool:
+        # data_version only moves when another connection commits, so this is one cheap pragma
+        # until a different cabinet actually records a score
+        now = monotonic()
+        if now - self.last_poll < self.poll_interval:
+            return False
+        self.last_poll = now
+        if self.connection.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+            return False
+        self.refresh()
+        return True
+
+    def top(self, count: int, difficulty: str | None = None) -> list[tuple[str, float, str]]:
+        if difficulty is None:
+            return self.connection.execute("SELECT name, weight, difficulty FROM scores ORDER BY weight DESC, set_at LIMIT ?", (count,)).fetchall()
+        return self.connection.execute("SELECT name, weight, difficulty FROM scores WHERE difficulty = ? ORDER BY weight DESC, set_at LIMIT ?", (difficulty, count)).fetchall()
+
+    def best_of(self, name: str) -> float | None:
+        row = self.connection.execute("SELECT weight FROM scores WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def submit(self, name: str, weight: float, difficulty: str) -> bool:
+        cursor = self.connection.execute(
+            "INSERT INTO scores VALUES (?, ?, ?, ?) ON CONFLICT (name) DO UPDATE "
+            "SET weight = excluded.weight, difficulty = excluded.difficulty, set_at = excluded.set_at "
+            "WHERE excluded.weight > scores.weight",
+            (name, weight, difficulty, time()),
+        )
+        if not cursor.rowcount:
+            return False
+        self.refresh()
+        return True
+
+    def import_scores(self, scores) -> int:
+        # one transaction, so a half finished import never shows up on the menus
+        imported = 0
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            for order, (name, weight, difficulty) in enumerate(scores):
+                cursor = self.connection.execute(
+                    "INSERT INTO scores VALUES (?, ?, ?, ?) ON CONFLICT (name) DO UPDATE "
+                    "SET weight = excluded.weight, difficulty = excluded.difficulty, set_at = excluded.set_at "
+                    "WHERE excluded.weight > scores.weight",
+                    (name, weight, difficulty, order), # keeps the text file's order for ties
+                )
+                imported += cursor.rowcount
+        self.refresh()
+        return imported
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int | slice) -> tuple[str, float, str] | list[tuple[str, float, str]]:
+        return self.rows[index]
+
+    def __iter__(self) -> Iterator[tuple[str, float, str]]:
+        return iter(self.rows)
+
+SCORE_BACKENDS = {
+    "journal": ScoreStore,
+    "sqlite": SQLiteScoreStore,
+}
+
+def make_score_store(backend: str = "journal", path: str = "high_scores.txt") -> ScoreStore | SQLiteScoreStore:
+    if backend not in SCORE_BACKENDS:
+        print(f"[score_store] unknown score backend {backend}, using journal")
+        backend = "journal"
+    return SCORE_BACKENDS[backend](path)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "import":
+        print("usage: python score_store.py import high_scores.txt high_scores.db")
+        sys.exit(1)
+    # reading through ScoreStore picks up the journal too, and keeps only each name's best
+    store = SQLiteScoreStore(sys.argv[3])
+    imported = store.import_scores(ScoreStore(sys.argv[2]))
+    total = store.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+    print(f"[score_store] imported {imported} scores from {sys.argv[2]} into {sys.argv[3]}, {total} on the leaderboard")
+    store.close()
@@ -0,0 +1,29 @@
+# fixed timestep accumulator, so the simulation advances by the same amount every step
+# no matter how long a frame took to render
+
+SIM_RATE = 60 # simulation steps per second
+MAX_CATCH_UP_STEPS = 5 # after a long stall, drop time instead of running a burst of steps
+
+class FixedTimestep:
+
+    def __init__(self, rate: int = SIM_RATE, max_steps: int = MAX_CATCH_UP_STEPS) -> None:
+        self.step = 1/rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.steps = 0 # total steps run
+        self.dropped_time = 0.0 # seconds thrown away by the catch up cap
+
+    def advance(self, elapsed: float) -> int:
+        # returns how many simulation steps to run for this much real time
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step + 1e-9)
+        if steps > self.max_steps:
+            self.dropped_time += (steps - self.max_steps) * self.step
+            self.accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.accumulator = max(self.accumulator - steps*self.step, 0.0)
+        self.steps += steps
+        return steps
+
+    def reset(self):
+        self.accumulator = 0.0